@@ -1,11 +1,50 @@
-from fastapi import FastAPI, Depends, HTTPException
-from sqlmodel import SQLModel, Field, Relationship, Session, create_engine, select
+from fastapi import FastAPI, Depends, HTTPException, Query
+from fastapi.concurrency import run_in_threadpool
+from sqlmodel import SQLModel, Field, Relationship, Session, select, insert, delete, literal, func, text, Index
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import selectinload
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 from typing import List, Optional
+import asyncio
+import atexit
+from bisect import bisect_right
+from contextlib import asynccontextmanager
+import os
+import sys
+from functools import partial
+from change_tracker import ChangeTracker
+from db import DB_ASYNC, create_sqlite_engine, create_async_sqlite_engine, ensure_indexes, session_dependency, session_endpoint, table_changes, track_changes
+from export import EXPORT_FORMAT_PATTERN, export_response
+from group_commit import GroupCommitWriter
+from pagination import PAGE_SIZE, MAX_PAGE_SIZE, encode_cursor, decode_cursor, paginate
+from response_cache import ResponseCache
+from social_graph import SocialGraph
+from tag_index import TagIndex
+from sql_metrics import instrument
 
 DATABASE_URL = "sqlite:///./test.db"
-engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False})
+engine = create_sqlite_engine(DATABASE_URL)
+request_engine = create_async_sqlite_engine(DATABASE_URL) if DB_ASYNC else engine
+
+FEED_PAGE_SIZE = 20
+FEED_MAX_PAGE_SIZE = 100
+# сколько последних постов автора попадает в ленту при подписке
+FEED_BACKFILL = 200
+TAG_QUERY_PAGE_SIZE = 20
+TAG_QUERY_MAX_PAGE_SIZE = 100
+SEARCH_PAGE_SIZE = 20
+SEARCH_MAX_PAGE_SIZE = 100
+
+# Групповой коммит для like/follow/comment: GROUP_COMMIT=1. Ответ уходит после
+# коммита пакета; переживет ли он отключение питания, решает SQLITE_SYNCHRONOUS
+GROUP_COMMIT = os.getenv("GROUP_COMMIT") == "1"
+GROUP_COMMIT_MAX_ROWS = int(os.getenv("GROUP_COMMIT_MAX_ROWS", "256"))
+GROUP_COMMIT_MAX_DELAY_MS = float(os.getenv("GROUP_COMMIT_MAX_DELAY_MS", "5"))
 
 app = FastAPI()
+instrument(app, request_engine)
+response_cache = ResponseCache()
+response_cache.attach(app)
 
 # ---- ПРОМЕЖУТОЧНЫЕ ТАБЛИЦЫ ----
 
@@ -16,6 +55,8 @@ class PostTag(SQLModel, table=True):
 # ---- МОДЕЛИ ----
 
 class Subscription(SQLModel, table=True):
+    __table_args__ = (Index("ix_subscription_follower_followed", "follower_id", "followed_id", unique=True),)
+
     id: Optional[int] = Field(default=None, primary_key=True)
     follower_id: int = Field(foreign_key="user.id")
     followed_id: int = Field(foreign_key="user.id")
@@ -69,6 +110,8 @@ class Tag(SQLModel, table=True):
     posts: List["Post"] = Relationship(back_populates="tags", link_model=PostTag)
 
 class Like(SQLModel, table=True):
+    __table_args__ = (Index("ix_like_user_post", "user_id", "post_id", unique=True),)
+
     id: Optional[int] = Field(default=None, primary_key=True)
     user_id: int = Field(foreign_key="user.id")
     post_id: int = Field(foreign_key="post.id")
@@ -76,18 +119,268 @@ class Like(SQLModel, table=True):
     user: User = Relationship(back_populates="likes")
     post: Post = Relationship(back_populates="likes")
 
+# Материализованная лента: строка на каждый пост в ленте каждого подписчика
+class FeedEntry(SQLModel, table=True):
+    user_id: int = Field(foreign_key="user.id", primary_key=True)
+    post_id: int = Field(foreign_key="post.id", primary_key=True)
+    author_id: int = Field(foreign_key="user.id")
+
+# Денормализованные счетчики, обновляются в той же транзакции, что и запись
+class PostCounters(SQLModel, table=True):
+    post_id: int = Field(foreign_key="post.id", primary_key=True)
+    likes_count: int = Field(default=0)
+    comments_count: int = Field(default=0)
+
+class UserCounters(SQLModel, table=True):
+    user_id: int = Field(foreign_key="user.id", primary_key=True)
+    posts_count: int = Field(default=0)
+    followers_count: int = Field(default=0)
+    following_count: int = Field(default=0)
+
 # Создаем таблицы
 SQLModel.metadata.create_all(engine)
 
-# ---- УТИЛИТЫ ----
+# Уникальные индексы не создадутся, пока в старой базе есть дубликаты, которые
+# успели записать параллельные like/follow; оставляем самую раннюю строку
+def delete_duplicates(connection, table, columns) -> int:
+    key = ", ".join(column.name for column in columns)
+    return connection.execute(text(
+        f'DELETE FROM "{table.name}" WHERE id NOT IN (SELECT MIN(id) FROM "{table.name}" GROUP BY {key})'
+    )).rowcount
+
+_duplicates_removed = 0
+with engine.begin() as _connection:
+    for _table in (Like.__table__, Subscription.__table__):
+        for _index in _table.indexes:
+            if _index.unique and not _connection.execute(
+                text("SELECT 1 FROM sqlite_master WHERE type = 'index' AND name = :name"), {"name": _index.name}
+            ).first():
+                _duplicates_removed += delete_duplicates(_connection, _table, _index.columns)
+
+ensure_indexes(engine, Like.__table__, Subscription.__table__)
+
+# ---- ПОЛНОТЕКСТОВЫЙ ПОИСК ----
+# rowid = id * 2 для постов и id * 2 + 1 для комментариев, чтобы триггеры
+# обновляли индекс по rowid без сканирования
+
+SEARCH_INDEX_DDL = [
+    """CREATE VIRTUAL TABLE IF NOT EXISTS search_index
+       USING fts5(title, content, tokenize='unicode61 remove_diacritics 2')""",
+    """CREATE TRIGGER IF NOT EXISTS post_search_insert AFTER INSERT ON post BEGIN
+           INSERT INTO search_index (rowid, title, content) VALUES (new.id * 2, new.title, new.content);
+       END""",
+    """CREATE TRIGGER IF NOT EXISTS post_search_update AFTER UPDATE OF title, content ON post BEGIN
+           DELETE FROM search_index WHERE rowid = old.id * 2;
+           INSERT INTO search_index (rowid, title, content) VALUES (new.id * 2, new.title, new.content);
+       END""",
+    """CREATE TRIGGER IF NOT EXISTS post_search_delete AFTER DELETE ON post BEGIN
+           DELETE FROM search_index WHERE rowid = old.id * 2;
+       END""",
+    """CREATE TRIGGER IF NOT EXISTS comment_search_insert AFTER INSERT ON comment BEGIN
+           INSERT INTO search_index (rowid, title, content) VALUES (new.id * 2 + 1, '', new.content);
+       END""",
+    """CREATE TRIGGER IF NOT EXISTS comment_search_update AFTER UPDATE OF content ON comment BEGIN
+           DELETE FROM search_index WHERE rowid = old.id * 2 + 1;
+           INSERT INTO search_index (rowid, title, content) VALUES (new.id * 2 + 1, '', new.content);
+       END""",
+    """CREATE TRIGGER IF NOT EXISTS comment_search_delete AFTER DELETE ON comment BEGIN
+           DELETE FROM search_index WHERE rowid = old.id * 2 + 1;
+       END""",
+]
+
+with engine.begin() as _connection:
+    for _statement in SEARCH_INDEX_DDL:
+        _connection.execute(text(_statement))
+
+def rebuild_search_index():
+    with engine.begin() as connection:
+        connection.execute(text("DELETE FROM search_index"))
+        connection.execute(text("INSERT INTO search_index (rowid, title, content) SELECT id * 2, title, content FROM post"))
+        connection.execute(text("INSERT INTO search_index (rowid, title, content) SELECT id * 2 + 1, '', content FROM comment"))
+
+def rebuild_feeds():
+    with Session(engine) as session:
+        session.exec(delete(FeedEntry))
+        session.exec(insert(FeedEntry).from_select(
+            ["user_id", "post_id", "author_id"],
+            select(Subscription.follower_id, Post.id, Post.user_id)
+            .join(Post, Post.user_id == Subscription.followed_id)
+        ))
+        session.commit()
+
+def rebuild_counters():
+    with Session(engine) as session:
+        session.exec(delete(PostCounters))
+        session.exec(delete(UserCounters))
+        session.exec(insert(PostCounters).from_select(
+            ["post_id", "likes_count", "comments_count"],
+            select(
+                Post.id,
+                select(func.count()).where(Like.post_id == Post.id).scalar_subquery(),
+                select(func.count()).where(Comment.post_id == Post.id).scalar_subquery(),
+            )
+        ))
+        session.exec(insert(UserCounters).from_select(
+            ["user_id", "posts_count", "followers_count", "following_count"],
+            select(
+                User.id,
+                select(func.count()).where(Post.user_id == User.id).scalar_subquery(),
+                select(func.count()).where(Subscription.followed_id == User.id).scalar_subquery(),
+                select(func.count()).where(Subscription.follower_id == User.id).scalar_subquery(),
+            )
+        ))
+        session.commit()
+
+# Заполняем ленты и счетчики для баз, созданных до появления этих таблиц
+with Session(engine) as _session:
+    if _session.exec(select(FeedEntry.post_id).limit(1)).first() is None:
+        rebuild_feeds()
+    # счетчики считали и удаленные дубликаты
+    if _duplicates_removed or _session.exec(select(UserCounters.user_id).limit(1)).first() is None:
+        rebuild_counters()
+    if _session.exec(text("SELECT rowid FROM search_index LIMIT 1")).first() is None:
+        rebuild_search_index()
+
+# Копии таблиц в памяти: свои записи применяются после коммита, записи
+# других воркеров ChangeTracker замечает по счетчику table_changes
+track_changes(engine, "subscription", "posttag")
+
+def read_table_changes(table: str) -> int:
+    with Session(engine) as session:
+        return table_changes(session, table)
+
+def load_social_graph():
+    with Session(engine) as session:
+        social_graph.load(session.exec(select(Subscription.follower_id, Subscription.followed_id)).all())
 
-def get_db():
+social_graph = SocialGraph()
+social_graph_changes = ChangeTracker(partial(read_table_changes, "subscription"), load_social_graph)
+social_graph_changes.refresh()
+
+def load_tag_index():
     with Session(engine) as session:
-        yield session
+        tag_index.load(session.exec(select(PostTag.post_id, PostTag.tag_id)).all())
+
+# Инвертированный индекс тегов
+tag_index = TagIndex()
+tag_index_changes = ChangeTracker(partial(read_table_changes, "posttag"), load_tag_index)
+tag_index_changes.refresh()
+
+# ---- УТИЛИТЫ ----
+
+get_db = session_dependency(request_engine)
+
+group_writer = None
+if GROUP_COMMIT:
+    group_writer = GroupCommitWriter(engine, max_rows=GROUP_COMMIT_MAX_ROWS, max_delay_ms=GROUP_COMMIT_MAX_DELAY_MS)
+    atexit.register(group_writer.close)
+
+def commit_write(fn):
+    with Session(engine, expire_on_commit=False) as session:
+        result = fn(session)
+        session.commit()
+        return result
+
+# fn(session) пишет без commit; коммитит либо запрос, либо групповой писатель
+async def run_write(fn):
+    if group_writer is not None:
+        return await asyncio.wrap_future(group_writer.submit(fn))
+    if DB_ASYNC:
+        async with asynccontextmanager(get_db)() as session:
+            result = await session.run_sync(fn)
+            await session.commit()
+            return result
+    return await run_in_threadpool(commit_write, fn)
+
+# ---- ЗАПРОСЫ ----
+# Каждый запрос выполняется фиксированным числом SQL-операторов,
+# независимо от количества лайков, постов или подписок.
+
+def query_post_likers(db: Session, post_id: int) -> List[str]:
+    return db.exec(
+        select(User.name)
+        .join(Like, Like.user_id == User.id)
+        .where(Like.post_id == post_id)
+        .order_by(Like.id)
+    ).all()
+
+def query_users_post_count(db: Session):
+    return db.exec(
+        select(User.name, func.coalesce(UserCounters.posts_count, 0))
+        .outerjoin(UserCounters, UserCounters.user_id == User.id)
+        .order_by(User.id)
+    ).all()
+
+def query_followers(db: Session, user_id: int, cursor: Optional[str], limit: int):
+    return paginate(
+        db,
+        select(Subscription.id, User.id, User.name)
+        .join(Subscription, Subscription.follower_id == User.id)
+        .where(Subscription.followed_id == user_id),
+        [Subscription.id], cursor, limit, key=lambda row: (row[0],)
+    )
+
+def query_following(db: Session, user_id: int, cursor: Optional[str], limit: int):
+    return paginate(
+        db,
+        select(Subscription.id, User.id, User.name)
+        .join(Subscription, Subscription.followed_id == User.id)
+        .where(Subscription.follower_id == user_id),
+        [Subscription.id], cursor, limit, key=lambda row: (row[0],)
+    )
+
+def query_user_with_posts(db: Session, user_id: int) -> Optional[User]:
+    return db.exec(
+        select(User).where(User.id == user_id).options(selectinload(User.posts))
+    ).first()
+
+def bump_post_counters(db: Session, post_id: int, likes: int = 0, comments: int = 0):
+    db.exec(
+        sqlite_insert(PostCounters)
+        .values(post_id=post_id, likes_count=likes, comments_count=comments)
+        .on_conflict_do_update(
+            index_elements=[PostCounters.post_id],
+            set_={
+                "likes_count": PostCounters.likes_count + likes,
+                "comments_count": PostCounters.comments_count + comments,
+            },
+        )
+    )
+
+def bump_user_counters(db: Session, user_id: int, posts: int = 0, followers: int = 0, following: int = 0):
+    db.exec(
+        sqlite_insert(UserCounters)
+        .values(user_id=user_id, posts_count=posts, followers_count=followers, following_count=following)
+        .on_conflict_do_update(
+            index_elements=[UserCounters.user_id],
+            set_={
+                "posts_count": UserCounters.posts_count + posts,
+                "followers_count": UserCounters.followers_count + followers,
+                "following_count": UserCounters.following_count + following,
+            },
+        )
+    )
+
+def fan_out_post(db: Session, post: Post):
+    db.exec(insert(FeedEntry).from_select(
+        ["user_id", "post_id", "author_id"],
+        select(Subscription.follower_id, literal(post.id), literal(post.user_id))
+        .where(Subscription.followed_id == post.user_id)
+    ))
+
+def backfill_feed(db: Session, user_id: int, author_id: int):
+    db.exec(insert(FeedEntry).from_select(
+        ["user_id", "post_id", "author_id"],
+        select(literal(user_id), Post.id, Post.user_id)
+        .where(Post.user_id == author_id)
+        .order_by(Post.id.desc())
+        .limit(FEED_BACKFILL)
+    ).prefix_with("OR IGNORE"))
 
 # ---- ЭНДПОИНТЫ ----
 
 @app.post("/users/", tags=["Authentication"])
+@session_endpoint("db")
 def create_user(name: str, db: Session = Depends(get_db)):
     user = User(name=name)
     db.add(user)
@@ -97,6 +390,7 @@ def create_user(name: str, db: Session = Depends(get_db)):
 
 # Tags endpoints
 @app.post("/tags/", tags=["Tags"])
+@session_endpoint("db")
 def create_tag(name: str, db: Session = Depends(get_db)):
     existing_tag = db.exec(select(Tag).where(Tag.name == name)).first()
     if existing_tag:
@@ -105,23 +399,72 @@ def create_tag(name: str, db: Session = Depends(get_db)):
     tag = Tag(name=name)
     db.add(tag)
     db.commit()
+    response_cache.invalidate("tag")
     db.refresh(tag)
     return tag
 
 @app.get("/tags/", tags=["Tags"])
-def get_all_tags(db: Session = Depends(get_db)):
-    tags = db.exec(select(Tag)).all()
-    return tags
+@response_cache.cached("tag")
+@session_endpoint("db")
+def get_all_tags(
+    cursor: Optional[str] = None,
+    limit: int = Query(default=PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    db: Session = Depends(get_db)
+):
+    tags, next_cursor = paginate(db, select(Tag), [Tag.name, Tag.id], cursor, limit, key=lambda tag: (tag.name, tag.id))
+    return {"items": tags, "next_cursor": next_cursor}
 
 @app.get("/tags/{tag_id}/posts/", tags=["Tags"])
-def get_posts_by_tag(tag_id: int, db: Session = Depends(get_db)):
+@session_endpoint("db")
+def get_posts_by_tag(
+    tag_id: int,
+    cursor: Optional[str] = None,
+    limit: int = Query(default=PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    db: Session = Depends(get_db)
+):
     tag = db.get(Tag, tag_id)
     if not tag:
         raise HTTPException(status_code=404, detail="Tag not found")
-    return tag.posts
+    posts, next_cursor = paginate(
+        db,
+        select(Post).join(PostTag, PostTag.post_id == Post.id).where(PostTag.tag_id == tag_id),
+        [Post.id], cursor, limit, key=lambda post: (post.id,)
+    )
+    return {"items": posts, "next_cursor": next_cursor}
+
+@app.get("/tags/{tag_id}/related/", tags=["Tags"])
+def get_related_tags(tag_id: int, limit: int = Query(default=10, ge=1, le=100)):
+    tag_index_changes.refresh()
+    return [{"tag_id": related_id, "posts": count} for related_id, count in tag_index.related(tag_id, limit)]
+
+@app.get("/posts/by-tags/", tags=["Tags"])
+@session_endpoint("db")
+def get_posts_by_tags(
+    all_tags: List[int] = Query(default=[]),
+    any_tags: List[int] = Query(default=[]),
+    not_tags: List[int] = Query(default=[]),
+    cursor: Optional[str] = None,
+    limit: int = Query(default=TAG_QUERY_PAGE_SIZE, ge=1, le=TAG_QUERY_MAX_PAGE_SIZE),
+    db: Session = Depends(get_db)
+):
+    if not all_tags and not any_tags:
+        raise HTTPException(status_code=400, detail="all_tags or any_tags is required")
+    
+    tag_index_changes.refresh()
+    post_ids = tag_index.query(all_tags, any_tags, not_tags)
+    start = bisect_right(post_ids, decode_cursor(cursor, 1)[0]) if cursor else 0
+    page = post_ids[start:start + limit]
+    posts = db.exec(select(Post).where(Post.id.in_(page)).order_by(Post.id)).all() if page else []
+    
+    return {
+        "total": len(post_ids),
+        "items": posts,
+        "next_cursor": encode_cursor(page[-1]) if start + limit < len(post_ids) else None
+    }
 
 # Posts endpoints
 @app.post("/posts/", tags=["Posts"])
+@session_endpoint("db")
 def create_post(title: str, content: str, user_id: int, db: Session = Depends(get_db)):
     user = db.get(User, user_id)
     if not user:
@@ -129,11 +472,19 @@ def create_post(title: str, content: str, user_id: int, db: Session = Depends(ge
     
     post = Post(title=title, content=content, user_id=user_id)
     db.add(post)
+    db.flush()
+    fan_out_post(db, post)
+    bump_user_counters(db, user_id, posts=1)
     db.commit()
     db.refresh(post)
     return post
 
+@app.get("/posts/export/", tags=["Posts"])
+def export_posts(format: str = Query(default="ndjson", pattern=EXPORT_FORMAT_PATTERN)):
+    return export_response(engine, Post, format)
+
 @app.post("/posts/{post_id}/tags/", tags=["Posts"])
+@session_endpoint("db")
 def add_tags_to_post(post_id: int, tag_ids: List[int], db: Session = Depends(get_db)):
     post = db.get(Post, post_id)
     if not post:
@@ -143,15 +494,23 @@ def add_tags_to_post(post_id: int, tag_ids: List[int], db: Session = Depends(get
     if len(tags) != len(tag_ids):
         raise HTTPException(status_code=404, detail="Some tags not found")
     
+    added = 0
     for tag in tags:
         if tag not in post.tags:
             post.tags.append(tag)
+            added += 1
     
+    db.flush()
+    changes = table_changes(db, "posttag")
     db.commit()
+    tag_index_changes.apply(changes, added, partial(tag_index.add, post_id, [tag.id for tag in tags]))
+    response_cache.invalidate("posttag", post_id)
     db.refresh(post)
     return post
 
 @app.get("/posts/{post_id}/tags/", tags=["Posts"])
+@response_cache.cached("posttag", scope="post_id")
+@session_endpoint("db")
 def get_post_tags(post_id: int, db: Session = Depends(get_db)):
     post = db.get(Post, post_id)
     if not post:
@@ -159,143 +518,331 @@ def get_post_tags(post_id: int, db: Session = Depends(get_db)):
     return post.tags
 
 # Comments endpoints
-@app.post("/comments/", tags=["Comments"])
-def create_comment(content: str, post_id: int, db: Session = Depends(get_db)):
+def write_comment(db: Session, content: str, post_id: int):
     post = db.get(Post, post_id)
     if not post:
         raise HTTPException(status_code=404, detail="Post not found")
     comment = Comment(content=content, post_id=post_id)
     db.add(comment)
-    db.commit()
-    db.refresh(comment)
+    db.flush()
+    bump_post_counters(db, post_id, comments=1)
+    return comment
+
+@app.post("/comments/", tags=["Comments"])
+async def create_comment(content: str, post_id: int):
+    comment = await run_write(lambda db: write_comment(db, content, post_id))
+    response_cache.invalidate("comment", post_id)
     return comment
 
+@app.get("/comments/export/", tags=["Comments"])
+def export_comments(format: str = Query(default="ndjson", pattern=EXPORT_FORMAT_PATTERN)):
+    return export_response(engine, Comment, format)
+
 @app.get("/posts/{post_id}/comments/", tags=["Comments"])
-def get_comments(post_id: int, db: Session = Depends(get_db)):
+@response_cache.cached("comment", scope="post_id")
+@session_endpoint("db")
+def get_comments(
+    post_id: int,
+    cursor: Optional[str] = None,
+    limit: int = Query(default=PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    db: Session = Depends(get_db)
+):
     post = db.get(Post, post_id)
     if not post:
         raise HTTPException(status_code=404, detail="Post not found")
-    return post.comments
+    comments, next_cursor = paginate(
+        db, select(Comment).where(Comment.post_id == post_id),
+        [Comment.id], cursor, limit, key=lambda comment: (comment.id,)
+    )
+    return {"items": comments, "next_cursor": next_cursor}
 
-# Likes endpoints
-@app.post("/posts/{post_id}/like/", tags=["Likes"])
-def like(post_id: int, user_id: int, db: Session = Depends(get_db)):
+@app.get("/posts/{post_id}/stats/", tags=["Posts"])
+@session_endpoint("db")
+def get_post_stats(post_id: int, db: Session = Depends(get_db)):
     post = db.get(Post, post_id)
     if not post:
         raise HTTPException(status_code=404, detail="Post not found")
-    user = db.get(User, user_id)
-    if not user:
+    counters = db.get(PostCounters, post_id) or PostCounters(post_id=post_id)
+    return {
+        "post_id": post_id,
+        "likes": counters.likes_count,
+        "comments": counters.comments_count
+    }
+
+# Likes endpoints
+def write_like(db: Session, post_id: int, user_id: int):
+    try:
+        result = db.exec(
+            sqlite_insert(Like)
+            .values(user_id=user_id, post_id=post_id)
+            .on_conflict_do_nothing(index_elements=["user_id", "post_id"])
+        )
+    except IntegrityError:
+        if not db.get(Post, post_id):
+            raise HTTPException(status_code=404, detail="Post not found")
         raise HTTPException(status_code=404, detail="User not found")
     
-    existing_like = db.exec(
-        select(Like).where(Like.user_id == user_id, Like.post_id == post_id)
-    ).first()
-    
-    if existing_like:
+    if result.rowcount == 0:
         raise HTTPException(status_code=400, detail="User already liked this post")
     
-    new_like = Like(user_id=user_id, post_id=post_id)
-    db.add(new_like)
-    db.commit()
-    db.refresh(new_like)
+    bump_post_counters(db, post_id, likes=1)
     return {"message": "Post liked successfully"}
 
+@app.post("/posts/{post_id}/like/", tags=["Likes"])
+async def like(post_id: int, user_id: int):
+    return await run_write(lambda db: write_like(db, post_id, user_id))
+
 @app.get("/posts/{post_id}/likes/", tags=["Likes"])
+@session_endpoint("db")
 def likes_users(post_id: int, db: Session = Depends(get_db)):
     post = db.get(Post, post_id)
     if not post:
         raise HTTPException(status_code=404, detail="Post not found")
     
-    likes_count = len(post.likes)
-    users_who_liked = [like.user.name for like in post.likes]
+    counters = db.get(PostCounters, post_id)
+    users_who_liked = query_post_likers(db, post_id)
     
     return {
         "post_id": post_id,
-        "likes": likes_count,
+        "likes": counters.likes_count if counters else 0,
         "users": users_who_liked
     }
 
 # Follow/Subscription endpoints
-@app.post("/users/{user_id}/follow/{target_id}/", tags=["Social"])
-def follow(user_id: int, target_id: int, db: Session = Depends(get_db)):
+def write_follow(db: Session, user_id: int, target_id: int):
     if user_id == target_id:
         raise HTTPException(status_code=400, detail="Cannot follow yourself")
     
-    follower = db.get(User, user_id)
-    followed = db.get(User, target_id)
-    if not follower or not followed:
+    try:
+        result = db.exec(
+            sqlite_insert(Subscription)
+            .values(follower_id=user_id, followed_id=target_id)
+            .on_conflict_do_nothing(index_elements=["follower_id", "followed_id"])
+        )
+    except IntegrityError:
         raise HTTPException(status_code=404, detail="User not found")
     
-    if db.exec(select(Subscription).where(Subscription.follower_id == user_id, Subscription.followed_id == target_id)).first():
+    if result.rowcount == 0:
         raise HTTPException(status_code=400, detail="Already following this user")
     
-    db.add(Subscription(follower_id=user_id, followed_id=target_id))
+    backfill_feed(db, user_id, target_id)
+    bump_user_counters(db, user_id, following=1)
+    bump_user_counters(db, target_id, followers=1)
+    
+    return {"message": f"User {user_id} now follows user {target_id}"}, table_changes(db, "subscription")
+
+@app.post("/users/{user_id}/follow/{target_id}/", tags=["Social"])
+async def follow(user_id: int, target_id: int):
+    # дубликат решает INSERT ... ON CONFLICT DO NOTHING; граф только ускоряет чтение
+    result, changes = await run_write(lambda db: write_follow(db, user_id, target_id))
+    social_graph_changes.apply(changes, 1, partial(social_graph.add, user_id, target_id))
+    return result
+
+@app.delete("/users/{user_id}/follow/{target_id}/", tags=["Social"])
+@session_endpoint("db")
+def unfollow(user_id: int, target_id: int, db: Session = Depends(get_db)):
+    result = db.exec(delete(Subscription).where(Subscription.follower_id == user_id, Subscription.followed_id == target_id))
+    if result.rowcount == 0:
+        raise HTTPException(status_code=404, detail="Not following this user")
+    
+    db.exec(delete(FeedEntry).where(FeedEntry.user_id == user_id, FeedEntry.author_id == target_id))
+    bump_user_counters(db, user_id, following=-1)
+    bump_user_counters(db, target_id, followers=-1)
+    changes = table_changes(db, "subscription")
     db.commit()
+    social_graph_changes.apply(changes, 1, partial(social_graph.remove, user_id, target_id))
     
-    return {"message": f"User {user_id} now follows user {target_id}"}
+    return {"message": f"User {user_id} no longer follows user {target_id}"}
 
 @app.get("/users/{user_id}/followers/", tags=["Social"])
-def get_followers(user_id: int, db: Session = Depends(get_db)):
+@session_endpoint("db")
+def get_followers(
+    user_id: int,
+    cursor: Optional[str] = None,
+    limit: int = Query(default=PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    db: Session = Depends(get_db)
+):
     user = db.get(User, user_id)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
-    followers = [subscription.follower for subscription in user.followers]
-    return [{"id": follower.id, "name": follower.name} for follower in followers]
+    followers, next_cursor = query_followers(db, user_id, cursor, limit)
+    return {
+        "items": [{"id": follower_id, "name": name} for _, follower_id, name in followers],
+        "next_cursor": next_cursor
+    }
 
 @app.get("/users/{user_id}/following/", tags=["Social"])
-def get_following(user_id: int, db: Session = Depends(get_db)):
+@session_endpoint("db")
+def get_following(
+    user_id: int,
+    cursor: Optional[str] = None,
+    limit: int = Query(default=PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    db: Session = Depends(get_db)
+):
     user = db.get(User, user_id)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
-    following = [subscription.followed for subscription in user.following]
-    return [{"id": followed.id, "name": followed.name} for followed in following]
+    following, next_cursor = query_following(db, user_id, cursor, limit)
+    return {
+        "items": [{"id": followed_id, "name": name} for _, followed_id, name in following],
+        "next_cursor": next_cursor
+    }
+
+@app.get("/users/{user_id}/mutuals/", tags=["Social"])
+def get_mutuals(user_id: int):
+    social_graph_changes.refresh()
+    return {"user_id": user_id, "mutuals": social_graph.mutuals(user_id)}
+
+@app.get("/users/{user_id}/common-followers/{other_id}/", tags=["Social"])
+def get_common_followers(user_id: int, other_id: int):
+    social_graph_changes.refresh()
+    return {
+        "user_id": user_id,
+        "other_id": other_id,
+        "common_followers": social_graph.common_followers(user_id, other_id)
+    }
+
+@app.get("/users/{user_id}/suggestions/", tags=["Social"])
+def get_suggestions(user_id: int, limit: int = Query(default=10, ge=1, le=100)):
+    social_graph_changes.refresh()
+    return [
+        {"id": candidate_id, "mutual_connections": count}
+        for candidate_id, count in social_graph.suggestions(user_id, limit)
+    ]
+
+@app.get("/social/graph/stats/", tags=["Social"])
+def get_social_graph_stats():
+    social_graph_changes.refresh()
+    return social_graph.stats()
 
 # User-related endpoints
 @app.get("/users/{user_id}/posts/", tags=["Users"])
+@session_endpoint("db")
 def get_user_posts(user_id: int, db: Session = Depends(get_db)):
-    user = db.get(User, user_id)
+    user = query_user_with_posts(db, user_id)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     return {"user": user.name, "posts": [p.title for p in user.posts]}
 
+@app.get("/users/{user_id}/stats/", tags=["Users"])
+@session_endpoint("db")
+def get_user_stats(user_id: int, db: Session = Depends(get_db)):
+    user = db.get(User, user_id)
+    if not user:
+        raise HTTPException(status_code=404, detail="User not found")
+    counters = db.get(UserCounters, user_id) or UserCounters(user_id=user_id)
+    return {
+        "user_id": user_id,
+        "posts": counters.posts_count,
+        "followers": counters.followers_count,
+        "following": counters.following_count
+    }
+
 @app.get("/users/posts/count/", tags=["Users"])
+@session_endpoint("db")
 def get_users_post_count(db: Session = Depends(get_db)):
-    users = db.exec(select(User)).all()
     result = []
-    for user in users:
-        post_count = len(user.posts)
+    for name, post_count in query_users_post_count(db):
         result.append({
-            "user": user.name,
+            "user": name,
             "post_count": post_count
         })
     return result
 
 # Feed endpoint
 @app.get("/feed/{user_id}/", tags=["Feed"])
-def get_feed(user_id: int, db: Session = Depends(get_db)):
+@session_endpoint("db")
+def get_feed(
+    user_id: int,
+    cursor: Optional[str] = None,
+    limit: int = Query(default=FEED_PAGE_SIZE, ge=1, le=FEED_MAX_PAGE_SIZE),
+    db: Session = Depends(get_db)
+):
     user = db.get(User, user_id)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     
-    following_users = db.exec(select(Subscription).where(Subscription.follower_id == user_id)).all()
-    followed_ids = [s.followed_id for s in following_users]
-    
-    if not followed_ids:
-        return {
-            "user": user.name,
-            "feed": []
-        }
+    query = (
+        select(Post, User.name)
+        .join(FeedEntry, FeedEntry.post_id == Post.id)
+        .join(User, FeedEntry.author_id == User.id)
+        .where(FeedEntry.user_id == user_id)
+    )
+    if cursor:
+        query = query.where(FeedEntry.post_id < decode_cursor(cursor, 1)[0])
     
-    posts = db.exec(select(Post, User.name).join(User, Post.user_id == User.id).where(Post.user_id.in_(followed_ids))).all()
+    posts = db.exec(query.order_by(FeedEntry.post_id.desc()).limit(limit)).all()
     feed_items = []
     for post, author_name in posts:
         feed_items.append({
+            "id": post.id,
             "author": author_name,
             "title": post.title,
             "content": post.content
         })
     
+    next_cursor = None
+    if len(posts) == limit:
+        next_cursor = encode_cursor(posts[-1][0].id)
+    
     return {
         "user": user.name,
-        "feed": feed_items
-    }
\ No newline at end of file
+        "feed": feed_items,
+        "next_cursor": next_cursor
+    }
+
+# Search endpoint
+@app.get("/search/", tags=["Search"])
+@session_endpoint("db")
+def search(
+    q: str = Query(min_length=1),
+    kind: Optional[str] = Query(default=None, pattern="^(post|comment)$"),
+    cursor: Optional[str] = None,
+    limit: int = Query(default=SEARCH_PAGE_SIZE, ge=1, le=SEARCH_MAX_PAGE_SIZE),
+    db: Session = Depends(get_db)
+):
+    terms = q.split()
+    if not terms:
+        raise HTTPException(status_code=400, detail="Empty query")
+    # каждое слово в кавычках: пользовательский ввод не разбирается как синтаксис FTS5
+    params = {"match": " ".join('"' + term.replace('"', '""') + '"' for term in terms), "limit": limit}
+    
+    query = """SELECT rowid, title, snippet(search_index, -1, '<b>', '</b>', '…', 12) AS snippet,
+                      bm25(search_index, 2.0, 1.0) AS score
+               FROM search_index WHERE search_index MATCH :match"""
+    if kind:
+        query += " AND rowid % 2 = :parity"
+        params["parity"] = 0 if kind == "post" else 1
+    query = f"SELECT * FROM ({query})"
+    if cursor:
+        params["score"], params["rowid"] = decode_cursor(cursor, 2)
+        query += " WHERE score > :score OR (score = :score AND rowid > :rowid)"
+    query += " ORDER BY score, rowid LIMIT :limit"
+    rows = db.exec(text(query), params=params).all()
+    
+    comment_ids = [rowid // 2 for rowid, *_ in rows if rowid % 2]
+    comment_posts = dict(db.exec(select(Comment.id, Comment.post_id).where(Comment.id.in_(comment_ids))).all()) if comment_ids else {}
+    
+    results = []
+    for rowid, title, snippet, score in rows:
+        if rowid % 2:
+            results.append({"kind": "comment", "id": rowid // 2, "post_id": comment_posts.get(rowid // 2), "snippet": snippet, "score": -score})
+        else:
+            results.append({"kind": "post", "id": rowid // 2, "post_id": rowid // 2, "title": title, "snippet": snippet, "score": -score})
+    
+    next_cursor = None
+    if len(rows) == limit:
+        next_cursor = encode_cursor(rows[-1][3], rows[-1][0])
+    
+    return {"results": results, "next_cursor": next_cursor}
+
+COMMANDS = {
+    "rebuild-feeds": rebuild_feeds,
+    "rebuild-counters": rebuild_counters,
+    "rebuild-search": rebuild_search_index,
+}
+
+if __name__ == "__main__":
+    if len(sys.argv) != 2 or sys.argv[1] not in COMMANDS:
+        sys.exit(f"usage: python ForeignKey.py {{{'|'.join(COMMANDS)}}}")
+    COMMANDS[sys.argv[1]]()
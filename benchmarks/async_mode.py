@@ -0,0 +1,72 @@
+"""library2.py в sync- и async-режиме (DB_ASYNC) на одной и той же таблице маршрутов.
+
+    python benchmarks/async_mode.py [--requests 5000] [--concurrency 200]
+
+Каждый режим запускается в отдельном процессе на временной базе.
+Нужен httpx (его же использует fastapi.testclient).
+"""
+import argparse
+import asyncio
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BOOKS = 10_000
+
+
+async def run(app, requests: int, concurrency: int) -> float:
+    import httpx
+
+    semaphore = asyncio.Semaphore(concurrency)
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        async def one(i):
+            async with semaphore:
+                if i % 10 == 0:
+                    response = await client.put(f"/books/{random.randint(1, BOOKS)}", json={"title": f"t{i}"})
+                else:
+                    response = await client.get(f"/books/{random.randint(1, BOOKS)}")
+                response.raise_for_status()
+
+        start = time.perf_counter()
+        await asyncio.gather(*(one(i) for i in range(requests)))
+        return requests / (time.perf_counter() - start)
+
+
+def child(requests: int, concurrency: int):
+    sys.path.insert(0, ROOT)
+    os.chdir(tempfile.mkdtemp())
+    import library2
+    from sqlmodel import Session
+
+    with Session(library2.engine) as session:
+        session.add_all(library2.Book(title=f"book{i}", author=f"author{i % 100}") for i in range(BOOKS))
+        session.commit()
+    print(f"{asyncio.run(run(library2.app, requests, concurrency)):.0f}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--concurrency", type=int, default=200)
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        child(args.requests, args.concurrency)
+        return
+
+    for mode in ("0", "1"):
+        output = subprocess.run(
+            [sys.executable, __file__, "--child", "--requests", str(args.requests), "--concurrency", str(args.concurrency)],
+            env={**os.environ, "DB_ASYNC": mode}, capture_output=True, text=True, check=True,
+        ).stdout.split()[-1]
+        print(f"{'async' if mode == '1' else 'sync ':5} DB_ASYNC={mode}: {output:>8} req/s  (90% GET /books/{{id}}, 10% PUT)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+"""Пиковая память: выгрузка всей таблицы книг одним JSON-массивом и через /books/export.
+
+    python benchmarks/export.py [--books 200000]
+
+Запускается на временной базе. Нужен httpx (его же использует fastapi.testclient).
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def measure(label: str, fn):
+    tracemalloc.start()
+    start = time.perf_counter()
+    size = fn()
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    print(f"{label:28} {elapsed:7.2f} s  peak {peak / 2**20:8.1f} MiB  {size / 2**20:8.1f} MiB sent")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--books", type=int, default=200_000)
+    args = parser.parse_args()
+
+    sys.path.insert(0, ROOT)
+    os.chdir(tempfile.mkdtemp())
+    import library2
+    from fastapi.testclient import TestClient
+    from sqlmodel import Session, select
+
+    with Session(library2.engine) as session:
+        session.add_all(library2.Book(title=f"book{i}", author=f"author{i % 100}") for i in range(args.books))
+        session.commit()
+
+    def materialized():
+        # то, что раньше делал GET /books: все строки ORM-объектами и один массив
+        from fastapi.encoders import jsonable_encoder
+        from fastapi.responses import JSONResponse
+        with Session(library2.engine) as session:
+            return len(JSONResponse(jsonable_encoder(session.exec(select(library2.Book)).all())).body)
+
+    def streamed(format):
+        def run():
+            size = 0
+            with TestClient(library2.app) as client:
+                with client.stream("GET", f"/books/export?format={format}") as response:
+                    for chunk in response.iter_bytes():
+                        size += len(chunk)
+            return size
+        return run
+
+    measure("materialized JSON array", materialized)
+    measure("/books/export ndjson", streamed("ndjson"))
+    measure("/books/export csv", streamed("csv"))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""Лайки в секунду: коммит на каждый запрос против группового коммита.
+
+    python benchmarks/group_commit.py [--likes 5000] [--concurrency 200]
+
+Запускается на временной базе, рабочие *.db файлы не трогает. По умолчанию с
+SQLITE_SYNCHRONOUS=FULL: оба режима подтверждают запись только после fsync.
+При NORMAL (умолчание приложений) коммит в WAL не ждет fsync, и сравниваются
+два режима без долговечности: SQLITE_SYNCHRONOUS=NORMAL python benchmarks/group_commit.py
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(tempfile.mkdtemp())
+os.environ.setdefault("SQLITE_SYNCHRONOUS", "FULL")
+
+import ForeignKey  # noqa: E402
+from group_commit import GroupCommitWriter  # noqa: E402
+from sqlmodel import Session  # noqa: E402
+
+
+def seed(users: int, posts: int):
+    with Session(ForeignKey.engine) as session:
+        session.add_all(ForeignKey.User(name=f"user{i}") for i in range(users))
+        session.flush()
+        session.add_all(ForeignKey.Post(title=f"post{i}", content="", user_id=1) for i in range(posts))
+        session.commit()
+
+
+async def run(pairs, concurrency: int) -> float:
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(post_id, user_id):
+        async with semaphore:
+            await ForeignKey.like(post_id, user_id)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(post_id, user_id) for post_id, user_id in pairs))
+    return len(pairs) / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--likes", type=int, default=5000)
+    parser.add_argument("--concurrency", type=int, default=200)
+    parser.add_argument("--max-rows", type=int, default=ForeignKey.GROUP_COMMIT_MAX_ROWS)
+    parser.add_argument("--max-delay-ms", type=float, default=ForeignKey.GROUP_COMMIT_MAX_DELAY_MS)
+    args = parser.parse_args()
+
+    users = 1000
+    posts = 2 * args.likes // users + 1
+    seed(users, posts)
+    pairs = [(post_id, user_id) for post_id in range(1, posts + 1) for user_id in range(1, users + 1)]
+    first, second = pairs[:args.likes], pairs[args.likes:2 * args.likes]
+
+    ForeignKey.group_writer = None
+    per_request = asyncio.run(run(first, args.concurrency))
+
+    ForeignKey.group_writer = GroupCommitWriter(ForeignKey.engine, args.max_rows, args.max_delay_ms)
+    grouped = asyncio.run(run(second, args.concurrency))
+    ForeignKey.group_writer.close()
+
+    print(f"synchronous={os.environ['SQLITE_SYNCHRONOUS']}")
+    print(f"per-request commit: {per_request:10.0f} likes/s")
+    print(f"group commit:       {grouped:10.0f} likes/s  (max_rows={args.max_rows}, max_delay_ms={args.max_delay_ms})")
+    print(f"speedup:            {grouped / per_request:10.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+"""Строк в секунду: POST /students по одной строке против POST /students/bulk и ingest.py.
+
+    python benchmarks/ingest.py [--rows 20000] [--single 2000]
+
+Все способы пишут по очереди в одну временную базу. Нужен httpx (его же использует fastapi.testclient).
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def rows(count: int):
+    return [{"name": f"student{i}", "group": f"G-{i % 40}", "average_score": i % 50 / 10} for i in range(count)]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=20_000)
+    parser.add_argument("--single", type=int, default=2_000, help="строк для построчного варианта")
+    args = parser.parse_args()
+    sys.path.insert(0, ROOT)
+    workdir = tempfile.mkdtemp()
+    os.chdir(workdir)
+    import database
+    from fastapi.testclient import TestClient
+
+    client = TestClient(database.app)
+    start = time.perf_counter()
+    for row in rows(args.single):
+        client.post("/students", json=row).raise_for_status()
+    print(f"POST /students x{args.single:<8} {args.single / (time.perf_counter() - start):>9.0f} rows/s")
+
+    for format in ("json", "ndjson", "csv"):
+        data = rows(args.rows)
+        if format == "json":
+            body = json.dumps(data)
+        elif format == "ndjson":
+            body = "\n".join(json.dumps(row) for row in data)
+        else:
+            body = "name,group,average_score\n" + "\n".join(f"{r['name']},{r['group']},{r['average_score']}" for r in data)
+        start = time.perf_counter()
+        response = client.post(f"/students/bulk?format={format}", content=body.encode())
+        response.raise_for_status()
+        assert response.json()["inserted"] == args.rows
+        print(f"POST /students/bulk {format:7}  {args.rows / (time.perf_counter() - start):>9.0f} rows/s")
+
+    path = os.path.join(workdir, "students.csv")
+    with open(path, "w") as stream:
+        stream.write("name,group,average_score\n")
+        stream.writelines(f"{r['name']},{r['group']},{r['average_score']}\n" for r in rows(args.rows))
+    output = subprocess.run(
+        [sys.executable, os.path.join(ROOT, "ingest.py"), "students", path],
+        cwd=workdir, env={**os.environ, "PYTHONPATH": ROOT}, capture_output=True, text=True, check=True,
+    ).stdout.strip()
+    print(f"python ingest.py students csv: {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,149 @@
+"""Журнал и снимки из persistence.py для хранилищ library.py, store.py и movie.py.
+
+    python benchmarks/journal_replay.py [--records 2000000] [--threads 32] [--seconds 3] [--store movies]
+
+Для каждого хранилища:
+  - запись через Journal.write с --threads потоками: записей/с и записей на один fsync;
+  - запуск только из журнала на --records записей (проигрывание);
+  - снимок этого состояния и запуск из снимка (mmap) плюс хвост журнала в 1%.
+Все файлы пишутся во временный каталог.
+"""
+import argparse
+import os
+import random
+import shutil
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def stores():
+    from library import Book
+    from store import Product
+    from book_catalogue import BookCatalogue
+    from price_index import ProductStore
+    from movie_store import MovieStore
+
+    def book(i):
+        return BookCatalogue.record(Book(id=i, title=f"Title {i}", author=f"Author {i % 50_000}", year=1900 + i % 120))
+
+    def product(i):
+        return ProductStore.record(Product(id=i, name=f"product{i}", price=round(random.uniform(1, 10_000), 2)))
+
+    def movie(i):
+        return MovieStore.record(i, f"Movie title {i}", random.randint(1920, 2024), round(random.uniform(1, 10), 1))
+
+    return {
+        "books": (lambda: BookCatalogue(factory=Book), book),
+        "products": (lambda: ProductStore(factory=Product), product),
+        "movies": (MovieStore, movie),
+    }
+
+
+def size_of(directory: str, name: str) -> str:
+    total = sum(os.path.getsize(os.path.join(directory, f)) for f in os.listdir(directory) if f.startswith(name + "."))
+    return f"{total / 2**20:.1f} MiB"
+
+
+def write_log(directory: str, name: str, generation: int, records):
+    from persistence import frame
+    os.makedirs(directory, exist_ok=True)
+    with open(os.path.join(directory, f"{name}.{generation:08d}.log"), "ab") as file:
+        chunk = []
+        for record in records:
+            chunk.append(frame(record))
+            if len(chunk) == 100_000:
+                file.write(b"".join(chunk))
+                chunk = []
+        file.write(b"".join(chunk))
+
+
+def bench_writes(directory: str, name: str, make_store, encode, threads: int, seconds: float):
+    from persistence import Journal
+    store = make_store()
+    journal = Journal(name, store, directory, snapshot_records=10**12)
+    stop = time.perf_counter() + seconds
+    counter = iter(range(10**12))
+    fsyncs = [0]
+    original = os.fsync
+
+    def counting_fsync(fd):
+        fsyncs[0] += 1
+        original(fd)
+
+    def worker():
+        while time.perf_counter() < stop:
+            record = encode(next(counter))
+            journal.write(record, lambda: True, lambda: store.replay([record]))
+
+    os.fsync = counting_fsync
+    try:
+        pool = [threading.Thread(target=worker) for _ in range(threads)]
+        start = time.perf_counter()
+        for thread in pool:
+            thread.start()
+        for thread in pool:
+            thread.join()
+        elapsed = time.perf_counter() - start
+    finally:
+        os.fsync = original
+    journal.close()
+    print(f"  write, {threads:3} threads {journal.written / elapsed:14,.0f} records/s"
+          f"  {journal.written / max(fsyncs[0], 1):8.1f} records/fsync")
+
+
+def bench_startup(directory: str, name: str, make_store, encode, records: int):
+    from persistence import Journal
+    write_log(directory, name, 0, (encode(i) for i in range(records)))
+    log_size = size_of(directory, name)
+
+    start = time.perf_counter()
+    journal = Journal(name, make_store(), directory, snapshot_records=10**12)
+    elapsed = time.perf_counter() - start
+    print(f"  startup, replay {records:,} records {elapsed:8.2f} s  {records / elapsed:12,.0f} records/s  log {log_size}")
+
+    start = time.perf_counter()
+    journal.snapshot()
+    print(f"  snapshot {len(journal.store):,} records {time.perf_counter() - start:14.2f} s  snapshot {size_of(directory, name)}")
+    journal.close()
+
+    tail = records // 100
+    write_log(directory, name, journal.generation, (encode(records + i) for i in range(tail)))
+    start = time.perf_counter()
+    journal = Journal(name, make_store(), directory, snapshot_records=10**12)
+    elapsed = time.perf_counter() - start
+    assert len(journal.store) == records + tail
+    print(f"  startup, snapshot + {tail:,} tail {elapsed:12.2f} s  {(records + tail) / elapsed:12,.0f} records/s")
+    journal.close()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--records", type=int, default=2_000_000)
+    parser.add_argument("--threads", type=int, default=32)
+    parser.add_argument("--seconds", type=float, default=3)
+    parser.add_argument("--store", choices=("books", "products", "movies"), action="append")
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp()
+    # приложения при импорте открывают свои журналы - пусть это будет временный каталог
+    os.environ["PERSIST_DIR"] = os.path.join(directory, "apps")
+    sys.path.insert(0, ROOT)
+    random.seed(0)
+    try:
+        for name, (make_store, encode) in stores().items():
+            if args.store and name not in args.store:
+                continue
+            print(f"-- {name}")
+            for threads in (1, args.threads):
+                bench_writes(os.path.join(directory, f"{name}-writes-{threads}"), name, make_store, encode, threads, args.seconds)
+            bench_startup(os.path.join(directory, f"{name}-startup"), name, make_store, encode, args.records)
+    finally:
+        shutil.rmtree(directory)
+
+
+if __name__ == "__main__":
+    main()
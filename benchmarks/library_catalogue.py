@@ -0,0 +1,74 @@
+"""BookCatalogue из library.py против прежних линейных проходов по списку на 1M книг.
+
+    python benchmarks/library_catalogue.py [--books 1000000] [--queries 200]
+
+Прежняя реализация воспроизведена здесь функциями над списком books.
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def timed(label: str, queries: int, fn):
+    start = time.perf_counter()
+    for i in range(queries):
+        fn(i)
+    elapsed = (time.perf_counter() - start) / queries
+    print(f"{label:40} {elapsed * 1e6:12.1f} us/op")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--books", type=int, default=1_000_000)
+    parser.add_argument("--queries", type=int, default=200)
+    args = parser.parse_args()
+
+    sys.path.insert(0, ROOT)
+    from library import Book
+    from book_catalogue import BookCatalogue
+
+    random.seed(0)
+    authors = [f"Author {i:05d}" for i in range(args.books // 20)]
+    books = [
+        Book(id=i, title=f"Title {random.getrandbits(40):x}", author=random.choice(authors), year=1900 + i % 120)
+        for i in range(args.books)
+    ]
+    books_ids = [book.id for book in books]
+
+    start = time.perf_counter()
+    catalogue = BookCatalogue()
+    catalogue.load(books)
+    print(f"load {args.books} books {time.perf_counter() - start:31.2f} s")
+
+    queries = args.queries
+    probe_ids = [random.randrange(args.books) for _ in range(queries)]
+    probe_authors = [random.choice(authors) for _ in range(queries)]
+    probe_prefixes = [f"Title {random.getrandbits(12):x}"[:9] for _ in range(queries)]
+    slow = max(1, queries // 20)
+
+    print("-- duplicate id check (add_book)")
+    timed("old: id not in books_ids", slow, lambda i: probe_ids[i] not in books_ids)
+    timed("new: id in catalogue.by_id", queries, lambda i: probe_ids[i] in catalogue.by_id)
+
+    print("-- GET /books?author=")
+    timed("old: scan books", slow, lambda i: [b for b in books if b.author == probe_authors[i]])
+    timed("new: catalogue.find(author)", queries, lambda i: catalogue.find(author=probe_authors[i]))
+
+    print("-- title prefix search, 20 results")
+    timed("old: scan books with startswith", slow,
+          lambda i: [b for b in books if b.title.lower().startswith(probe_prefixes[i].lower())][:20])
+    timed("new: catalogue.search(title_prefix)", queries, lambda i: catalogue.search(title_prefix=probe_prefixes[i]))
+
+    print("-- POST /books into a 1M catalogue")
+    next_id = args.books
+    def add(i):
+        catalogue.add(Book(id=next_id + i, title=f"New {i}", author=random.choice(authors), year=2000))
+    timed("new: catalogue.add", queries, add)
+
+
+if __name__ == "__main__":
+    main()
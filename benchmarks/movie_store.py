@@ -0,0 +1,73 @@
+"""MovieStore из movie.py против прежнего списка pydantic-моделей на 1M фильмов.
+
+    python benchmarks/movie_store.py [--movies 1000000] [--queries 20]
+
+Память меряется tracemalloc, поиск - запросом "1990-2000, рейтинг >= 8, top-20 по рейтингу".
+"""
+import argparse
+import gc
+import os
+import random
+import sys
+import time
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def build(label: str, fn):
+    gc.collect()
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = fn()
+    elapsed = time.perf_counter() - start
+    memory = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    print(f"{label:36} {elapsed:8.2f} s  {memory / 2**20:8.1f} MiB")
+    return result
+
+
+def timed(label: str, queries: int, fn):
+    start = time.perf_counter()
+    for _ in range(queries):
+        fn()
+    print(f"{label:36} {(time.perf_counter() - start) / queries * 1e3:8.2f} ms/op")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--movies", type=int, default=1_000_000)
+    parser.add_argument("--queries", type=int, default=20)
+    args = parser.parse_args()
+
+    sys.path.insert(0, ROOT)
+    from movie import Movie
+    from movie_store import MovieStore
+
+    random.seed(0)
+    rows = [(i, f"Movie title {i}", random.randint(1920, 2024), round(random.uniform(1, 10), 1)) for i in range(args.movies)]
+
+    models = build("old: list of pydantic Movie", lambda: [Movie(id=i, title=t, year=y, rating=r) for i, t, y, r in rows])
+
+    def columnar():
+        store = MovieStore()
+        store.load(rows)
+        return store
+    store = build("new: MovieStore", columnar)
+
+    def old_query():
+        matches = [m for m in models if 1990 <= m.year <= 2000 and m.rating >= 8]
+        return sorted(matches, key=lambda m: (-m.rating, m.id))[:20]
+
+    def new_query():
+        return store.query(year_from=1990, year_to=2000, min_rating=8, limit=20)[1]
+
+    assert [m.id for m in old_query()] == [m["id"] for m in new_query()]
+    timed("old: filter + sort list", args.queries, old_query)
+    timed("new: MovieStore.query", args.queries, new_query)
+    timed("old: get_movie linear scan", args.queries, lambda: next(m for m in models if m.id == args.movies - 1))
+    timed("new: MovieStore.get", args.queries, lambda: store.get(args.movies - 1))
+
+
+if __name__ == "__main__":
+    main()
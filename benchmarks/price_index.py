@@ -0,0 +1,73 @@
+"""ProductStore из store.py против прежнего линейного прохода по списку на 10^6 товаров.
+
+    python benchmarks/price_index.py [--products 1000000] [--queries 200]
+
+Прежняя реализация product_serch воспроизведена здесь функцией над списком.
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def timed(label: str, queries: int, fn):
+    start = time.perf_counter()
+    for i in range(queries):
+        fn(i)
+    elapsed = (time.perf_counter() - start) / queries
+    print(f"{label:44} {elapsed * 1e6:12.1f} us/op")
+
+
+def linear_search(products, min_price, max_price):
+    result = []
+    for product in products:
+        if min_price <= product.price <= max_price:
+            result.append(product)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--products", type=int, default=1_000_000)
+    parser.add_argument("--queries", type=int, default=200)
+    args = parser.parse_args()
+
+    sys.path.insert(0, ROOT)
+    from store import Product
+    from price_index import ProductStore
+
+    random.seed(0)
+    products = [Product(id=i, name=f"product{i}", price=round(random.uniform(1, 10_000), 2)) for i in range(args.products)]
+
+    start = time.perf_counter()
+    store = ProductStore()
+    store.load(products)
+    print(f"load {args.products} products {time.perf_counter() - start:34.2f} s")
+
+    queries = args.queries
+    slow = max(1, queries // 20)
+    narrow = [(low, low + 10) for low in (random.uniform(1, 9_990) for _ in range(queries))]
+    wide = [(low, low + 2_000) for low in (random.uniform(1, 8_000) for _ in range(queries))]
+
+    for label, ranges in (("narrow range, ~1k matches", narrow), ("wide range, ~200k matches", wide)):
+        print(f"-- {label}")
+        timed("old: linear scan, all matches", slow, lambda i: linear_search(products, *ranges[i]))
+        timed("new: store.range, first page of 100", queries, lambda i: store.range(*ranges[i], 100))
+        timed("new: store.range, all matches", slow, lambda i: store.range(*ranges[i], len(products)))
+
+    print("-- top-K and histogram")
+    timed("old: sorted(products)[:10]", slow, lambda i: sorted(products, key=lambda p: p.price)[:10])
+    timed("new: store.cheapest(10)", queries, lambda i: store.cheapest(10))
+    timed("new: store.most_expensive(10)", queries, lambda i: store.most_expensive(10))
+    timed("new: store.histogram(100)", queries, lambda i: store.histogram(100))
+
+    print("-- POST /products into the store")
+    timed("new: store.add", queries,
+          lambda i: store.add(Product(id=args.products + i, name="new", price=random.uniform(1, 10_000))))
+
+
+if __name__ == "__main__":
+    main()
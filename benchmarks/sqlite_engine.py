@@ -0,0 +1,97 @@
+"""Конкурентные чтения и записи: create_engine по умолчанию против db.create_sqlite_engine.
+
+    python benchmarks/sqlite_engine.py [--readers 16] [--writers 4] [--seconds 5]
+
+Каждая конфигурация работает со своей временной базой.
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from sqlalchemy import text  # noqa: E402
+from sqlalchemy.exc import OperationalError  # noqa: E402
+from sqlmodel import create_engine  # noqa: E402
+
+from db import create_sqlite_engine  # noqa: E402
+
+ROWS = 100_000
+
+
+def prepare(engine):
+    with engine.begin() as conn:
+        conn.execute(text("CREATE TABLE item (id INTEGER PRIMARY KEY, name VARCHAR NOT NULL, score FLOAT NOT NULL)"))
+        conn.execute(
+            text("INSERT INTO item (name, score) VALUES (:name, :score)"),
+            [{"name": f"item{i}", "score": random.random()} for i in range(ROWS)],
+        )
+
+
+def run(engine, readers: int, writers: int, seconds: float):
+    stop = threading.Event()
+    counts = {"reads": 0, "writes": 0, "errors": 0}
+    lock = threading.Lock()
+
+    def reader():
+        done = 0
+        while not stop.is_set():
+            with engine.connect() as conn:
+                conn.execute(text("SELECT name, score FROM item WHERE id = :id"), {"id": random.randint(1, ROWS)}).all()
+            done += 1
+        with lock:
+            counts["reads"] += done
+
+    def writer():
+        done = errors = 0
+        while not stop.is_set():
+            try:
+                with engine.begin() as conn:
+                    conn.execute(text("UPDATE item SET score = :score WHERE id = :id"),
+                                 {"score": random.random(), "id": random.randint(1, ROWS)})
+                done += 1
+            except OperationalError:
+                errors += 1
+        with lock:
+            counts["writes"] += done
+            counts["errors"] += errors
+
+    threads = [threading.Thread(target=reader) for _ in range(readers)]
+    threads += [threading.Thread(target=writer) for _ in range(writers)]
+    for thread in threads:
+        thread.start()
+    time.sleep(seconds)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    return {key: value / seconds for key, value in counts.items()}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--readers", type=int, default=16)
+    parser.add_argument("--writers", type=int, default=4)
+    parser.add_argument("--seconds", type=float, default=5)
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp()
+    configs = {
+        "defaults": lambda url: create_engine(url, connect_args={"check_same_thread": False}),
+        "tuned": create_sqlite_engine,
+    }
+    for name, make_engine in configs.items():
+        engine = make_engine(f"sqlite:///{os.path.join(directory, name)}.db")
+        prepare(engine)
+        result = run(engine, args.readers, args.writers, args.seconds)
+        engine.dispose()
+        print(f"{name:9} reads/s {result['reads']:10.0f}   writes/s {result['writes']:8.0f}   "
+              f"lock errors/s {result['errors']:6.1f}")
+
+
+if __name__ == "__main__":
+    main()
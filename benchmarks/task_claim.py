@@ -0,0 +1,73 @@
+"""Выдачи в секунду у /tasks/claim при нескольких одновременных воркерах.
+
+    python benchmarks/task_claim.py [--tasks 20000] [--workers 1 8 32] [--batch 1 10]
+
+Каждый воркер в цикле берет задачи и завершает их, пока очередь не опустеет.
+Заодно проверяется, что ни одна задача не была выдана дважды. Запускается на
+временной базе. Нужен httpx (его же использует fastapi.testclient).
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def fill(to_do_list, tasks: int):
+    from sqlmodel import text
+
+    with to_do_list.engine.begin() as connection:
+        connection.execute(text("DELETE FROM task"))
+        connection.execute(
+            text("INSERT INTO task (title, completed, created_at, priority) VALUES (:title, 0, :created_at, :priority)"),
+            [{"title": f"task{i}", "created_at": f"2026-01-01 00:00:{i % 60:02d}.{i:06d}", "priority": i % 5 + 1}
+             for i in range(tasks)],
+        )
+
+
+async def run(app, workers: int, batch: int):
+    import httpx
+
+    claimed = []
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        async def worker(name):
+            while True:
+                response = await client.post(f"/tasks/claim?worker={name}&limit={batch}")
+                response.raise_for_status()
+                tasks = response.json()["tasks"]
+                if not tasks:
+                    return
+                for task in tasks:
+                    claimed.append(task["id"])
+                    (await client.post(f"/tasks/{task['id']}/complete?worker={name}")).raise_for_status()
+
+        start = time.perf_counter()
+        await asyncio.gather(*(worker(f"w{i}") for i in range(workers)))
+        return claimed, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--tasks", type=int, default=20_000)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--batch", type=int, nargs="+", default=[1, 10])
+    args = parser.parse_args()
+
+    sys.path.insert(0, ROOT)
+    os.chdir(tempfile.mkdtemp())
+    import to_do_list
+
+    for batch in args.batch:
+        for workers in args.workers:
+            fill(to_do_list, args.tasks)
+            claimed, elapsed = asyncio.run(run(to_do_list.app, workers, batch))
+            assert len(claimed) == len(set(claimed)) == args.tasks, "task claimed twice or lost"
+            print(f"workers={workers:<3} batch={batch:<3} {len(claimed) / elapsed:8.0f} tasks/s claimed and completed")
+
+
+if __name__ == "__main__":
+    main()
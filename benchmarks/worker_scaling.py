@@ -0,0 +1,175 @@
+"""Пропускная способность чтения movie.py, store.py или library.py под uvicorn --workers N.
+
+    python benchmarks/worker_scaling.py [--app movies] [--records 200000] [--workers 1 2 4 8]
+                                        [--clients 16] [--seconds 5]
+
+Данные пишутся в журнал во временном каталоге PERSIST_DIR, и все воркеры
+поднимают их оттуда. Перед замером проверяется, что запись, сделанная через
+один воркер, видна в ответах всех остальных. Нагрузку дают --clients процессов.
+
+Каждый запрос идет новым соединением: с --workers uvicorn не включает
+TCP_NODELAY на общем сокете, и keep-alive упирается в задержанный ACK (~40 мс).
+Нужен uvicorn; масштабирование видно только при числе ядер не меньше
+воркеров плюс клиентов.
+"""
+import argparse
+import http.client
+import json
+import multiprocessing
+import os
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+APPS = {
+    "movies": ("movie:app", "/movies/query?year_from=1990&year_to=2000&min_rating=8&limit=20"),
+    "products": ("store:app", "/products/search?min_price=100&max_price=110&limit=100"),
+    "books": ("library:app", "/books/search?title=title%2012&limit=20"),
+}
+
+
+def seed(app: str, directory: str, records: int):
+    """Пишет records записей прямо в первый сегмент журнала."""
+    sys.path.insert(0, ROOT)
+    from persistence import frame
+    from book_catalogue import BookCatalogue
+    from price_index import ProductStore
+    from movie_store import MovieStore
+
+    random.seed(0)
+    if app == "movies":
+        name = "movies"
+        encode = lambda i: MovieStore.record(i, f"Movie title {i}", random.randint(1920, 2024), round(random.uniform(1, 10), 1))
+    elif app == "products":
+        name = "products"
+        encode = lambda i: ProductStore.record(Row(id=i, name=f"product{i}", price=round(random.uniform(1, 10_000), 2)))
+    else:
+        name = "books"
+        encode = lambda i: BookCatalogue.record(Row(id=i, title=f"Title {i}", author=f"Author {i % 5_000}", year=1900 + i % 120))
+    os.makedirs(directory, exist_ok=True)
+    with open(os.path.join(directory, f"{name}.00000000.log"), "wb") as file:
+        file.write(b"".join(frame(encode(i)) for i in range(records)))
+
+
+class Row:
+    def __init__(self, **fields):
+        self.__dict__.update(fields)
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def request(port: int, method: str, path: str, body=None):
+    connection = http.client.HTTPConnection("127.0.0.1", port, timeout=60)
+    try:
+        headers = {"Content-Type": "application/json"} if body is not None else {}
+        connection.request(method, path, body=json.dumps(body) if body is not None else None, headers=headers)
+        response = connection.getresponse()
+        return response.status, json.loads(response.read())
+    finally:
+        connection.close()
+
+
+def start_server(target: str, workers: int, port: int, env: dict) -> subprocess.Popen:
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", target, "--workers", str(workers), "--port", str(port), "--log-level", "warning"],
+        cwd=ROOT, env=env,
+    )
+    deadline = time.monotonic() + 600
+    while time.monotonic() < deadline:
+        try:
+            request(port, "GET", "/openapi.json")
+            return server
+        except OSError:
+            time.sleep(0.2)
+    server.terminate()
+    raise RuntimeError("uvicorn did not start")
+
+
+def check_shared(app: str, port: int, records: int, workers: int):
+    """Пишет через один воркер и читает новыми соединениями, попадающими в разные воркеры."""
+    new_id = records + 1
+    if app == "movies":
+        request(port, "POST", "/movies", {"id": new_id, "title": "shared", "year": 2000, "rating": 5})
+        path = f"/movies/{new_id}"
+    elif app == "products":
+        request(port, "POST", "/products", {"id": new_id, "name": "shared", "price": 0.5})
+        path = "/products/cheapest?k=1"
+    else:
+        request(port, "POST", "/books", {"id": new_id, "title": "shared", "author": "shared", "year": 1})
+        path = f"/books/{new_id}"
+    for _ in range(workers * 10):
+        status, body = request(port, "GET", path)
+        assert status == 200 and "shared" in json.dumps(body), body
+    if app == "products":
+        # курсор, выданный одним воркером, должны принимать все
+        cursor = request(port, "GET", "/products/search?min_price=0&max_price=1e9&limit=1")[1]["next_cursor"]
+        for _ in range(workers * 10):
+            status, body = request(port, "GET", f"/products/search?min_price=0&max_price=1e9&limit=1&cursor={cursor}")
+            assert status == 200, body
+
+
+def client(port: int, path: str, seconds: float, start_at: float, results):
+    while time.time() < start_at:
+        time.sleep(0.001)
+    done, stop = 0, start_at + seconds
+    while time.time() < stop:
+        request(port, "GET", path)
+        done += 1
+    results.put(done)
+
+
+def measure(port: int, path: str, clients: int, seconds: float) -> float:
+    results = multiprocessing.Queue()
+    start_at = time.time() + 1
+    pool = [multiprocessing.Process(target=client, args=(port, path, seconds, start_at, results)) for _ in range(clients)]
+    for process in pool:
+        process.start()
+    total = sum(results.get() for _ in pool)
+    for process in pool:
+        process.join()
+    return total / seconds
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--app", choices=tuple(APPS), default="movies")
+    parser.add_argument("--records", type=int, default=200_000)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--clients", type=int, default=16)
+    parser.add_argument("--seconds", type=float, default=5)
+    args = parser.parse_args()
+
+    target, path = APPS[args.app]
+    directory = tempfile.mkdtemp()
+    env = {**os.environ, "PERSIST_DIR": directory}
+    try:
+        seed(args.app, directory, args.records)
+        print(f"{args.app}: {args.records:,} records, GET {path}, {args.clients} clients, {os.cpu_count()} cpus")
+        baseline = None
+        for workers in args.workers:
+            port = free_port()
+            server = start_server(target, workers, port, env)
+            try:
+                check_shared(args.app, port, args.records, workers)
+                throughput = measure(port, path, args.clients, args.seconds)
+            finally:
+                server.terminate()
+                server.wait()
+            baseline = baseline or throughput
+            print(f"  {workers:3} workers {throughput:12,.0f} req/s  x{throughput / baseline:5.2f}")
+    finally:
+        shutil.rmtree(directory)
+
+
+if __name__ == "__main__":
+    main()
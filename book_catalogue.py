@@ -0,0 +1,187 @@
+import struct
+import threading
+from array import array
+from bisect import bisect_left, insort
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sorted_ids import insert, intersect
+
+# верхняя граница для поиска по префиксу: prefix <= key < prefix + PREFIX_END
+PREFIX_END = "\U0010ffff"
+
+# запись журнала и снимка: id, year, длины title и author в байтах, затем сами строки
+BOOK_RECORD = struct.Struct("<qiII")
+# диапазоны полей записи; модель API проверяет их, иначе struct.pack упадет на записи
+ID_MIN, ID_MAX = -2**63, 2**63 - 1
+YEAR_MIN, YEAR_MAX = -2**31, 2**31 - 1
+# с какого числа книг проигрывание журнала пересобирает индексы вместо вставок по одной
+BULK_REPLAY = 1024
+
+
+def normalize(text: str) -> str:
+    """Ключ для индексов: без учета регистра и лишних пробелов."""
+    return " ".join(text.split()).casefold()
+
+
+def _prefix_range(keys: List[Tuple[str, int]], prefix: str) -> Tuple[int, int]:
+    return bisect_left(keys, (prefix,)), bisect_left(keys, (prefix + PREFIX_END,))
+
+
+class BookCatalogue:
+    """Каталог книг в памяти: словарь по id, индексы по автору и году
+    (отсортированные массивы id) и отсортированные ключи для поиска по
+    префиксу автора и названия.
+
+    Книга - любой объект с полями id, title, author и year; factory(id=, title=,
+    author=, year=) собирает книгу из снимка или журнала.
+    """
+
+    def __init__(self, factory=None):
+        self.factory = factory
+        self.by_id: Dict[int, object] = {}
+        self.by_author: Dict[str, array] = {}
+        self.by_year: Dict[int, array] = {}
+        # (нормализованный ключ, id) по возрастанию
+        self.author_keys: List[Tuple[str, int]] = []
+        self.title_keys: List[Tuple[str, int]] = []
+        self._lock = threading.Lock()
+
+    def load(self, books: Iterable):
+        """Массовая загрузка: индексы строятся одной сортировкой, а не вставками по одной."""
+        with self._lock:
+            self.by_id, self.by_author, self.by_year = {}, {}, {}
+            self.author_keys, self.title_keys = [], []
+            self._extend(books)
+
+    def _extend(self, books: Iterable):
+        """Добавляет пачку книг к индексам; вызывается под блокировкой.
+
+        Новые id дописываются в конец массивов, и затронутые массивы
+        пересортировываются один раз - на почти упорядоченных данных это
+        быстрее вставок по одной.
+        """
+        authors, years, titles = set(), set(), []
+        for book in books:
+            if book.id in self.by_id:
+                continue
+            self.by_id[book.id] = book
+            author = normalize(book.author)
+            self.by_author.setdefault(author, array("q")).append(book.id)
+            self.by_year.setdefault(book.year, array("q")).append(book.id)
+            authors.add(author)
+            years.add(book.year)
+            titles.append((normalize(book.title), book.id))
+        for author in authors:
+            self.by_author[author] = array("q", sorted(self.by_author[author]))
+        for year in years:
+            self.by_year[year] = array("q", sorted(self.by_year[year]))
+        if len(self.author_keys) != len(self.by_author):
+            self.author_keys = sorted((author, 0) for author in self.by_author)
+        titles.sort()
+        self.title_keys += titles
+        self.title_keys.sort()
+
+    def add(self, book) -> bool:
+        """Добавляет книгу, False если книга с таким id уже есть."""
+        with self._lock:
+            if book.id in self.by_id:
+                return False
+            self.by_id[book.id] = book
+            author = normalize(book.author)
+            if author not in self.by_author:
+                self.by_author[author] = array("q")
+                insort(self.author_keys, (author, 0))
+            insert(self.by_author[author], book.id)
+            insert(self.by_year.setdefault(book.year, array("q")), book.id)
+            insort(self.title_keys, (normalize(book.title), book.id))
+            return True
+
+    def get(self, book_id: int):
+        return self.by_id.get(book_id)
+
+    def __len__(self) -> int:
+        return len(self.by_id)
+
+    def __contains__(self, book_id: int) -> bool:
+        return book_id in self.by_id
+
+    def all(self) -> List:
+        with self._lock:
+            return list(self.by_id.values())
+
+    def find(self, author: Optional[str] = None, year: Optional[int] = None) -> List:
+        """Книги автора и/или года по возрастанию id: O(k) по размеру результата."""
+        with self._lock:
+            postings = []
+            if author is not None:
+                postings.append(self.by_author.get(normalize(author), ()))
+            if year is not None:
+                postings.append(self.by_year.get(year, ()))
+            if not postings:
+                return list(self.by_id.values())
+            ids = postings[0] if len(postings) == 1 else intersect(*postings)
+            return [self.by_id[book_id] for book_id in ids]
+
+    def search(self, author_prefix: str = "", title_prefix: str = "", limit: int = 20) -> List:
+        """Книги, у которых автор и название начинаются с заданных префиксов.
+
+        Без title_prefix результат идет по авторам в алфавитном порядке, иначе
+        по названиям. Стоимость O(log n + k).
+        """
+        author_prefix, title_prefix = normalize(author_prefix), normalize(title_prefix)
+        with self._lock:
+            result = []
+            if title_prefix:
+                lo, hi = _prefix_range(self.title_keys, title_prefix)
+                for i in range(lo, hi):
+                    book = self.by_id[self.title_keys[i][1]]
+                    if not author_prefix or normalize(book.author).startswith(author_prefix):
+                        result.append(book)
+                        if len(result) == limit:
+                            break
+                return result
+            lo, hi = _prefix_range(self.author_keys, author_prefix)
+            for i in range(lo, hi):
+                for book_id in self.by_author[self.author_keys[i][0]]:
+                    result.append(self.by_id[book_id])
+                    if len(result) == limit:
+                        return result
+            return result
+
+    # ---- ЖУРНАЛ И СНИМКИ ----
+
+    @staticmethod
+    def record(book) -> bytes:
+        title, author = book.title.encode(), book.author.encode()
+        return BOOK_RECORD.pack(book.id, book.year, len(title), len(author)) + title + author
+
+    def _decode(self, buffer, offset: int):
+        book_id, year, title_length, author_length = BOOK_RECORD.unpack_from(buffer, offset)
+        start = offset + BOOK_RECORD.size
+        middle = start + title_length
+        end = middle + author_length
+        book = self.factory(id=book_id, title=str(buffer[start:middle], "utf-8"),
+                            author=str(buffer[middle:end], "utf-8"), year=year)
+        return book, end
+
+    def replay(self, records):
+        books = [self._decode(record, 0)[0] for record in records]
+        if len(books) < BULK_REPLAY:
+            for book in books:
+                self.add(book)
+        else:
+            with self._lock:
+                self._extend(books)
+
+    def snapshot_state(self) -> List:
+        return self.all()
+
+    def encode_snapshot(self, books: List) -> bytes:
+        return b"".join(map(self.record, books))
+
+    def restore(self, buffer):
+        books, offset, end = [], 0, len(buffer)
+        while offset < end:
+            book, offset = self._decode(buffer, offset)
+            books.append(book)
+        self.load(books)
@@ -0,0 +1,77 @@
+import operator
+
+from fastapi import HTTPException
+from sqlmodel import SQLModel, Session, update, delete
+
+# суффиксы полей фильтра: priority__lte -> priority <= значение
+OPERATORS = {
+    "lt": operator.lt,
+    "lte": operator.le,
+    "gt": operator.gt,
+    "gte": operator.ge,
+    "in": lambda column, value: column.in_(value),
+}
+
+
+def filter_clauses(model, filters: SQLModel) -> list:
+    """Условия WHERE из заданных полей фильтра. Пустой фильтр запрещен, чтобы
+    случайный запрос не изменил всю таблицу."""
+    clauses = []
+    for name, value in filters.model_dump(exclude_none=True).items():
+        column_name, _, suffix = name.partition("__")
+        column = getattr(model, column_name)
+        clauses.append(OPERATORS[suffix](column, value) if suffix else column == value)
+    if not clauses:
+        raise HTTPException(status_code=400, detail="At least one filter is required")
+    return clauses
+
+
+def _execute(session: Session, model, statement, returning: bool) -> dict:
+    statement = statement.execution_options(synchronize_session=False)
+    if returning:
+        ids = session.exec(statement.returning(model.id)).scalars().all()
+        session.commit()
+        return {"affected": len(ids), "ids": ids}
+    affected = session.exec(statement).rowcount
+    session.commit()
+    return {"affected": affected}
+
+
+def bulk_update(session: Session, model, filters: SQLModel, values: SQLModel, returning: bool = False) -> dict:
+    """Один UPDATE ... WHERE для всех строк под фильтром. Поля values со
+    значением None не меняются, как в обычных PUT-эндпоинтах."""
+    values = values.model_dump(exclude_none=True)
+    if not values:
+        raise HTTPException(status_code=400, detail="No values to update")
+    return _execute(session, model, update(model).where(*filter_clauses(model, filters)).values(**values), returning)
+
+
+def patch_by_id(session: Session, model, row_id: int, values: SQLModel, commit: bool = True):
+    """UPDATE ... SET <переданные поля> WHERE id = ? RETURNING * одним запросом.
+
+    Возвращает обновленную строку или None, если строки нет. Явный null
+    принимается только для nullable-столбцов, для остальных поле пропускается.
+    С commit=False транзакцию завершает вызывающий.
+    """
+    columns = model.__table__.columns
+    values = {
+        name: value for name, value in values.model_dump(exclude_unset=True).items()
+        if value is not None or columns[name].nullable
+    }
+    if not values:
+        return session.get(model, row_id)
+    row = session.exec(
+        update(model).where(model.id == row_id).values(**values).returning(model)
+        .execution_options(synchronize_session=False)
+    ).scalars().first()
+    # отсоединяем до commit, иначе commit пометит атрибуты устаревшими и
+    # ответ придется перечитывать из базы
+    if row is not None:
+        session.expunge(row)
+    if commit:
+        session.commit()
+    return row
+
+
+def bulk_delete(session: Session, model, filters: SQLModel, returning: bool = False) -> dict:
+    return _execute(session, model, delete(model).where(*filter_clauses(model, filters)), returning)
@@ -0,0 +1,78 @@
+import os
+import threading
+import time
+from typing import Callable, Dict, Optional, Tuple
+
+# как часто сверять копию в памяти с базой: чужие записи видны не позже чем через это время
+CHANGES_TTL_SECONDS = float(os.getenv("CHANGES_TTL_SECONDS", "1"))
+
+
+class ChangeTracker:
+    """Держит копию таблицы в памяти в согласии со счетчиком db.track_changes.
+
+    Свои записи процесс передает в apply() со счетчиком, прочитанным в их
+    транзакции после записи, и числом измененных строк. Записи применяются к
+    копии строго по порядку счетчика; если в нем дыра, таблицу менял кто-то
+    еще (ingest.py, другой воркер). Не чаще раза в ttl секунд refresh() сверяет
+    счетчик в базе с примененным и при расхождении перечитывает копию через
+    reload. Так одиночные записи API не вызывают полной перезагрузки.
+
+    Запись, закоммиченная во время перечитывания, может попасть и в новую
+    копию, и в apply(), поэтому функции apply должны быть идемпотентны.
+    """
+
+    def __init__(self, read_changes: Callable[[], int], reload: Callable[[], object], ttl: float = CHANGES_TTL_SECONDS):
+        self.read_changes = read_changes
+        self.reload = reload
+        self.ttl = ttl
+        # счетчик, до которого применена копия; None - копия перечитывается
+        # или ждет перечитывания, и свои записи только копятся в _pending
+        self._applied: Optional[int] = None
+        # свои записи, ждущие предыдущих по счетчику: начало -> (конец, функция)
+        self._pending: Dict[int, Tuple[int, Callable[[], object]]] = {}
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+        # перечитывание идет без _lock, чтобы apply() не ждал его
+        self._reload_lock = threading.Lock()
+
+    def invalidate(self):
+        """Сверить счетчик при следующем refresh(), не дожидаясь ttl, например
+        после своей массовой записи: она сдвинула счетчик, и копия перечитается."""
+        self._checked_at = 0.0
+
+    def refresh(self):
+        if self._applied is not None and time.monotonic() < self._checked_at + self.ttl:
+            return
+        with self._reload_lock:
+            if self._applied is not None and time.monotonic() < self._checked_at + self.ttl:
+                return
+            self._checked_at = time.monotonic()
+            changes = self.read_changes()
+            with self._lock:
+                if changes == self._applied:
+                    return
+                self._applied = None
+            # счетчик читается до загрузки: запись во время загрузки даст еще одну
+            self.reload()
+            with self._lock:
+                self._applied = changes
+                # записи до changes уже есть в загруженной копии
+                self._pending = {start: item for start, item in self._pending.items() if start >= changes}
+                self._drain()
+
+    def apply(self, changes: int, rows: int, fn: Callable[[], object]):
+        """Применяет к копии свою запись, изменившую rows строк; changes -
+        table_changes, прочитанный в ее транзакции после записи."""
+        if not rows:
+            return
+        with self._lock:
+            if self._applied is not None and changes <= self._applied:
+                return
+            self._pending[changes - rows] = (changes, fn)
+            if self._applied is not None:
+                self._drain()
+
+    def _drain(self):
+        while self._applied in self._pending:
+            self._applied, fn = self._pending.pop(self._applied)
+            fn()
@@ -1,5 +1,17 @@
-from sqlmodel import SQLModel, Field, create_engine, Session, select
-from fastapi import FastAPI, HTTPException
+from sqlmodel import SQLModel, Field, Session, select, Index
+from fastapi import FastAPI, Depends, HTTPException, Query, Request
+from fastapi.concurrency import run_in_threadpool
+from typing import List, Optional
+from functools import partial
+from bulk_mutations import bulk_update, bulk_delete, patch_by_id
+from change_tracker import ChangeTracker
+from db import DB_ASYNC, create_sqlite_engine, create_async_sqlite_engine, ensure_indexes, session_dependency, session_endpoint, table_changes, track_changes
+from export import EXPORT_FORMAT_PATTERN, export_response
+from ingest import INGEST_FORMAT_PATTERN, ingest_body
+from pagination import PAGE_SIZE, MAX_PAGE_SIZE, paginate
+from response_cache import ResponseCache
+from sql_metrics import instrument
+from student_analytics import StudentAnalytics
 
 app = FastAPI()
 
@@ -10,102 +22,265 @@ class Student(SQLModel, table=True):
     group: str
     average_score: float
 
+    __table_args__ = (
+        Index("ix_student_group_score", "group", "average_score"),
+        Index("ix_student_average_score", "average_score"),
+    )
+
 class Teacher(SQLModel, table=True):
     id: int = Field(default=None, primary_key=True)
     name: str
     subject: str
     experience: float = Field(ge=0)
 
+class StudentUpdate(SQLModel):
+    name: Optional[str] = None
+    group: Optional[str] = None
+    average_score: Optional[float] = None
+
+class TeacherUpdate(SQLModel):
+    name: Optional[str] = None
+    subject: Optional[str] = None
+    experience: Optional[float] = Field(default=None, ge=0)
+
+# поля фильтра для bulk-эндпоинтов, суффиксы см. bulk_mutations.OPERATORS
+class StudentFilter(SQLModel):
+    id__in: Optional[List[int]] = None
+    name: Optional[str] = None
+    group: Optional[str] = None
+    average_score__lt: Optional[float] = None
+    average_score__gte: Optional[float] = None
+
+class StudentBulkUpdate(SQLModel):
+    where: StudentFilter
+    values: StudentUpdate
+
 
-engine = create_engine("sqlite:///students.db")
+DATABASE_URL = "sqlite:///students.db"
+engine = create_sqlite_engine(DATABASE_URL)
+request_engine = create_async_sqlite_engine(DATABASE_URL) if DB_ASYNC else engine
+instrument(app, request_engine)
+response_cache = ResponseCache()
+response_cache.attach(app)
 SQLModel.metadata.create_all(engine)
 
-@app.get("/students")
-def get_students():
+ensure_indexes(engine, Student.__table__)
+
+track_changes(engine, "student")
+
+def load_student_scores():
     with Session(engine) as session:
-        return session.exec(select(Student)).all()
+        return session.exec(select(Student.id, Student.name, Student.group, Student.average_score)).all()
 
-@app.post("/students")
-def add_student(student: Student):
+def read_student_changes():
     with Session(engine) as session:
-        session.add(student)
-        session.commit()
-        session.refresh(student)
-        return {"message": f"студент {student.name} добавлен"}
+        return table_changes(session, "student")
+
+# Снимок для аналитики; свои записи применяются на месте, чужие
+# (ingest.py, другие воркеры) ChangeTracker замечает по счетчику и перечитывает
+student_analytics = StudentAnalytics()
+student_changes = ChangeTracker(read_student_changes, lambda: student_analytics.load(load_student_scores()))
+
+def commit_student_write(session: Session, rows: int, apply):
+    # счетчик читается в транзакции записи, чтобы ChangeTracker отличил ее от чужих
+    changes = table_changes(session, "student")
+    session.commit()
+    response_cache.invalidate("student")
+    student_changes.apply(changes, rows, apply)
+
+get_session = session_dependency(request_engine)
+
+@app.get("/students")
+@response_cache.cached("student")
+@session_endpoint()
+def get_students(
+    cursor: Optional[str] = None,
+    limit: int = Query(default=PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    session: Session = Depends(get_session)
+):
+    students, next_cursor = paginate(session, select(Student), [Student.id], cursor, limit, key=lambda row: (row.id,))
+    return {"items": students, "next_cursor": next_cursor}
+
+@app.get("/students/export")
+def export_students(format: str = Query(default="ndjson", pattern=EXPORT_FORMAT_PATTERN)):
+    return export_response(engine, Student, format)
+
+@app.post("/students")
+@session_endpoint()
+def add_student(student: Student, session: Session = Depends(get_session)):
+    session.add(student)
+    session.flush()
+    commit_student_write(session, 1, partial(student_analytics.upsert, student.id, student.name, student.group, student.average_score))
+    session.refresh(student)
+    return {"message": f"студент {student.name} добавлен"}
+
+@app.post("/students/bulk")
+async def add_students_bulk(request: Request, format: str = Query(default="json", pattern=INGEST_FORMAT_PATTERN)):
+    report = await run_in_threadpool(ingest_body, engine, Student, await request.body(), format)
+    if report["inserted"]:
+        response_cache.invalidate("student")
+        student_changes.invalidate()
+    return report
+
+@app.post("/students/bulk-update")
+@session_endpoint()
+def update_students_bulk(body: StudentBulkUpdate, returning: bool = False, session: Session = Depends(get_session)):
+    result = bulk_update(session, Student, body.where, body.values, returning)
+    if result["affected"]:
+        response_cache.invalidate("student")
+        student_changes.invalidate()
+    return result
+
+@app.post("/students/bulk-delete")
+@session_endpoint()
+def delete_students_bulk(where: StudentFilter, returning: bool = False, session: Session = Depends(get_session)):
+    result = bulk_delete(session, Student, where, returning)
+    if result["affected"]:
+        response_cache.invalidate("student")
+        student_changes.invalidate()
+    return result
+
+# ---- АНАЛИТИКА ПО ГРУППАМ ----
+
+@app.get("/students/analytics/groups")
+def get_group_analytics(percentiles: List[float] = Query(default=[25, 50, 75, 90])):
+    if any(not 0 <= percentile <= 100 for percentile in percentiles):
+        raise HTTPException(status_code=422, detail="перцентили должны быть от 0 до 100")
+    student_changes.refresh()
+    return student_analytics.groups(percentiles)
+
+@app.get("/students/analytics/groups/{group}/top")
+def get_group_top(group: str, k: int = Query(default=10, ge=1, le=1000)):
+    student_changes.refresh()
+    top = student_analytics.top(group, k)
+    if top is None:
+        raise HTTPException(status_code=404, detail="группа не найдена")
+    return top
+
+@app.get("/students/{student_id}/percentile")
+def get_student_percentile(student_id: int):
+    student_changes.refresh()
+    rank = student_analytics.percentile_rank(student_id)
+    if rank is None:
+        raise HTTPException(status_code=404, detail="студент не найден")
+    return rank
 
 @app.get("/students/{student_id}")
-def get_student(student_id: int):
-    with Session(engine) as session:
-        student = session.get(Student, student_id)
-        if not student:
-            raise HTTPException(status_code=404, detail="студент не найден")
-        return student
+@session_endpoint()
+def get_student(student_id: int, session: Session = Depends(get_session)):
+    student = session.get(Student, student_id)
+    if not student:
+        raise HTTPException(status_code=404, detail="студент не найден")
+    return student
 
 @app.put("/students/{student_id}")
-def update_student(student_id: int, update: Student):
-    with Session(engine) as session:
-        student = session.get(Student, student_id)
-        if not student:
-            raise HTTPException(status_code=404, detail="студент не найден")
-        student.name = update.name
-        student.group = update.group
-        student.average_score = update.average_score
-        session.add(student)
-        session.commit()
-        session.refresh(student)
-        return {"message": "данные студента обновлены"}
+@session_endpoint()
+def update_student(student_id: int, update: Student, session: Session = Depends(get_session)):
+    student = session.get(Student, student_id)
+    if not student:
+        raise HTTPException(status_code=404, detail="студент не найден")
+    student.name = update.name
+    student.group = update.group
+    student.average_score = update.average_score
+    # без изменений ORM не пишет UPDATE, и счетчик не растет
+    rows = int(session.is_modified(student))
+    session.add(student)
+    session.flush()
+    commit_student_write(session, rows, partial(student_analytics.upsert, student.id, student.name, student.group, student.average_score))
+    return {"message": "данные студента обновлены"}
+
+@app.patch("/students/{student_id}")
+@session_endpoint()
+def patch_student(student_id: int, update: StudentUpdate, session: Session = Depends(get_session)):
+    student = patch_by_id(session, Student, student_id, update, commit=False)
+    if not student:
+        raise HTTPException(status_code=404, detail="студент не найден")
+    # patch_by_id не пишет UPDATE, если не передано ни одного поля
+    rows = int(bool(update.model_dump(exclude_unset=True, exclude_none=True)))
+    commit_student_write(session, rows, partial(student_analytics.upsert, student.id, student.name, student.group, student.average_score))
+    return student
 
 @app.delete("/students/{student_id}")
-def delete_student(student_id: int):
-    with Session(engine) as session:
-        student = session.get(Student, student_id)
-        if not student:
-            raise HTTPException(status_code=404, detail="студент не найден")
-        session.delete(student)
-        session.commit()
-        return {"message": "студент удалён"}
+@session_endpoint()
+def delete_student(student_id: int, session: Session = Depends(get_session)):
+    student = session.get(Student, student_id)
+    if not student:
+        raise HTTPException(status_code=404, detail="студент не найден")
+    session.delete(student)
+    session.flush()
+    commit_student_write(session, 1, partial(student_analytics.remove, student_id))
+    return {"message": "студент удалён"}
 
 @app.get("/teachers")
-def get_teachers():
-    with Session(engine) as session:
-        return session.exec(select(Teacher)).all()
+@response_cache.cached("teacher")
+@session_endpoint()
+def get_teachers(
+    cursor: Optional[str] = None,
+    limit: int = Query(default=PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    session: Session = Depends(get_session)
+):
+    teachers, next_cursor = paginate(session, select(Teacher), [Teacher.id], cursor, limit, key=lambda row: (row.id,))
+    return {"items": teachers, "next_cursor": next_cursor}
+
+@app.get("/teachers/export")
+def export_teachers(format: str = Query(default="ndjson", pattern=EXPORT_FORMAT_PATTERN)):
+    return export_response(engine, Teacher, format)
 
 @app.post("/teachers")
-def add_teacher(teacher: Teacher):
-    with Session(engine) as session:
-        session.add(teacher)
-        session.commit()
-        session.refresh(teacher)
-        return {"message": f"учитель {teacher.name} добавлен"}
+@session_endpoint()
+def add_teacher(teacher: Teacher, session: Session = Depends(get_session)):
+    session.add(teacher)
+    session.commit()
+    response_cache.invalidate("teacher")
+    session.refresh(teacher)
+    return {"message": f"учитель {teacher.name} добавлен"}
+
+@app.post("/teachers/bulk")
+async def add_teachers_bulk(request: Request, format: str = Query(default="json", pattern=INGEST_FORMAT_PATTERN)):
+    report = await run_in_threadpool(ingest_body, engine, Teacher, await request.body(), format)
+    if report["inserted"]:
+        response_cache.invalidate("teacher")
+    return report
 
 @app.get("/teachers/{teacher_id}")
-def get_teacher(teacher_id: int):
-    with Session(engine) as session:
-        teacher = session.get(Teacher, teacher_id)
-        if not teacher:
-            raise HTTPException(status_code=404, detail="учитель не найден")
-        return teacher
+@session_endpoint()
+def get_teacher(teacher_id: int, session: Session = Depends(get_session)):
+    teacher = session.get(Teacher, teacher_id)
+    if not teacher:
+        raise HTTPException(status_code=404, detail="учитель не найден")
+    return teacher
 
 @app.put("/teachers/{teacher_id}")
-def update_teacher(teacher_id: int, update: Teacher):
-    with Session(engine) as session:
-        teacher = session.get(Teacher, teacher_id)
-        if not teacher:
-            raise HTTPException(status_code=404, detail="учитель не найден")
-        teacher.name = update.name
-        teacher.subject = update.subject
-        teacher.experience = update.experience
-        session.add(teacher)
-        session.commit()
-        session.refresh(teacher)
-        return {"message": "данные учителя обновлены"}
+@session_endpoint()
+def update_teacher(teacher_id: int, update: Teacher, session: Session = Depends(get_session)):
+    teacher = session.get(Teacher, teacher_id)
+    if not teacher:
+        raise HTTPException(status_code=404, detail="учитель не найден")
+    teacher.name = update.name
+    teacher.subject = update.subject
+    teacher.experience = update.experience
+    session.add(teacher)
+    session.commit()
+    response_cache.invalidate("teacher")
+    session.refresh(teacher)
+    return {"message": "данные учителя обновлены"}
+
+@app.patch("/teachers/{teacher_id}")
+@session_endpoint()
+def patch_teacher(teacher_id: int, update: TeacherUpdate, session: Session = Depends(get_session)):
+    teacher = patch_by_id(session, Teacher, teacher_id, update)
+    if not teacher:
+        raise HTTPException(status_code=404, detail="учитель не найден")
+    response_cache.invalidate("teacher")
+    return teacher
 
 @app.delete("/teachers/{teacher_id}")
-def delete_teacher(teacher_id: int):
-    with Session(engine) as session:
-        teacher = session.get(Teacher, teacher_id)
-        if not teacher:
-            raise HTTPException(status_code=404, detail="учитель не найден")
-        session.delete(teacher)
-        session.commit()
-        return {"message": "учитель удалён"}
\ No newline at end of file
+@session_endpoint()
+def delete_teacher(teacher_id: int, session: Session = Depends(get_session)):
+    teacher = session.get(Teacher, teacher_id)
+    if not teacher:
+        raise HTTPException(status_code=404, detail="учитель не найден")
+    session.delete(teacher)
+    session.commit()
+    response_cache.invalidate("teacher")
+    return {"message": "учитель удалён"}
\ No newline at end of file
@@ -0,0 +1,119 @@
+import functools
+import os
+
+from sqlalchemy import event, text
+from sqlalchemy.engine import Engine
+from sqlmodel import Session, create_engine
+
+# Настройки SQLite, общие для всех приложений; переопределяются переменными окружения
+SQLITE_JOURNAL_MODE = os.getenv("SQLITE_JOURNAL_MODE", "WAL")
+SQLITE_SYNCHRONOUS = os.getenv("SQLITE_SYNCHRONOUS", "NORMAL")
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+SQLITE_CACHE_SIZE_KB = int(os.getenv("SQLITE_CACHE_SIZE_KB", "65536"))
+SQLITE_MMAP_SIZE = int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024)))
+# по умолчанию FastAPI выполняет sync-эндпоинты в пуле из 40 потоков
+SQLITE_POOL_SIZE = int(os.getenv("SQLITE_POOL_SIZE", "40"))
+SQLITE_POOL_OVERFLOW = int(os.getenv("SQLITE_POOL_OVERFLOW", "10"))
+# DB_ASYNC=1: запросы идут через AsyncSession и aiosqlite вместо пула потоков
+DB_ASYNC = os.getenv("DB_ASYNC") == "1"
+
+
+def set_sqlite_pragmas(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    cursor.execute(f"PRAGMA journal_mode={SQLITE_JOURNAL_MODE}")
+    cursor.execute(f"PRAGMA synchronous={SQLITE_SYNCHRONOUS}")
+    cursor.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}")
+    # отрицательный cache_size задается в килобайтах, а не в страницах
+    cursor.execute(f"PRAGMA cache_size=-{SQLITE_CACHE_SIZE_KB}")
+    cursor.execute(f"PRAGMA mmap_size={SQLITE_MMAP_SIZE}")
+    cursor.execute("PRAGMA foreign_keys=ON")
+    cursor.close()
+
+
+def create_sqlite_engine(url: str) -> Engine:
+    engine = create_engine(
+        url,
+        connect_args={"check_same_thread": False, "timeout": SQLITE_BUSY_TIMEOUT_MS / 1000},
+        pool_size=SQLITE_POOL_SIZE,
+        max_overflow=SQLITE_POOL_OVERFLOW,
+    )
+    event.listen(engine, "connect", set_sqlite_pragmas)
+    return engine
+
+
+def ensure_indexes(engine: Engine, *tables):
+    """Создает недостающие индексы таблиц: create_all не добавляет их в уже
+    существующие таблицы."""
+    for table in tables:
+        for index in table.indexes:
+            index.create(engine, checkfirst=True)
+
+
+def track_changes(engine: Engine, *tables: str):
+    """Триггеры, считающие в table_changes измененные строки каждой таблицы.
+
+    Счетчик растет при любой записи: через API любого воркера, ingest.py или
+    sqlite3. По нему копии таблиц в памяти замечают чужие записи (ChangeTracker).
+    """
+    with engine.begin() as connection:
+        connection.execute(text("CREATE TABLE IF NOT EXISTS table_changes (name TEXT PRIMARY KEY, changes INTEGER NOT NULL)"))
+        for table in tables:
+            connection.execute(text("INSERT OR IGNORE INTO table_changes (name, changes) VALUES (:name, 0)"), {"name": table})
+            for action in ("INSERT", "UPDATE", "DELETE"):
+                connection.execute(text(
+                    f"""CREATE TRIGGER IF NOT EXISTS {table}_changes_{action.lower()} AFTER {action} ON "{table}" BEGIN
+                            UPDATE table_changes SET changes = changes + 1 WHERE name = '{table}';
+                        END"""
+                ))
+
+
+def table_changes(session: Session, table: str) -> int:
+    """Счетчик изменений table; внутри пишущей транзакции учитывает и ее строки."""
+    return session.exec(text("SELECT changes FROM table_changes WHERE name = :name").bindparams(name=table)).one()[0]
+
+
+def create_async_sqlite_engine(url: str):
+    # sqlalchemy.ext.asyncio требует greenlet, поэтому импортируем только в async-режиме
+    from sqlalchemy.ext.asyncio import create_async_engine
+
+    engine = create_async_engine(
+        url.replace("sqlite://", "sqlite+aiosqlite://", 1),
+        connect_args={"timeout": SQLITE_BUSY_TIMEOUT_MS / 1000},
+        pool_size=SQLITE_POOL_SIZE,
+        max_overflow=SQLITE_POOL_OVERFLOW,
+    )
+    event.listen(engine.sync_engine, "connect", set_sqlite_pragmas)
+    return engine
+
+
+def session_dependency(engine):
+    if DB_ASYNC:
+        from sqlmodel.ext.asyncio.session import AsyncSession
+
+        async def get_async_session():
+            async with AsyncSession(engine, expire_on_commit=False) as session:
+                yield session
+        return get_async_session
+
+    def get_session():
+        with Session(engine) as session:
+            yield session
+    return get_session
+
+
+def session_endpoint(param: str = "session"):
+    """Позволяет одному sync-эндпоинту работать в обоих режимах.
+
+    В async-режиме эндпоинт становится корутиной, а его тело выполняется через
+    AsyncSession.run_sync: запрос ждет базу, не занимая поток из пула FastAPI.
+    """
+    def decorator(fn):
+        if not DB_ASYNC:
+            return fn
+
+        @functools.wraps(fn)
+        async def wrapper(**kwargs):
+            async_session = kwargs[param]
+            return await async_session.run_sync(lambda session: fn(**{**kwargs, param: session}))
+        return wrapper
+    return decorator
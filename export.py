@@ -0,0 +1,61 @@
+import csv
+import io
+import json
+import os
+from datetime import date, datetime
+
+from fastapi.responses import StreamingResponse
+
+EXPORT_CHUNK_ROWS = int(os.getenv("EXPORT_CHUNK_ROWS", "1000"))
+EXPORT_FORMATS = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+EXPORT_FORMAT_PATTERN = "^(ndjson|csv)$"
+
+
+def _json_default(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def _partitions(engine, table):
+    # Строки читаются кортежами пачками по EXPORT_CHUNK_ROWS, без ORM-объектов;
+    # соединение открывается только когда клиент начал читать ответ.
+    query = table.select().order_by(*table.primary_key.columns)
+    with engine.connect() as connection:
+        result = connection.execution_options(yield_per=EXPORT_CHUNK_ROWS).execute(query)
+        yield from result.partitions()
+
+
+def _ndjson(columns, partitions):
+    for rows in partitions:
+        yield "".join(
+            json.dumps(dict(zip(columns, row)), ensure_ascii=False, default=_json_default) + "\n"
+            for row in rows
+        )
+
+
+def _csv(columns, partitions):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+    yield buffer.getvalue()
+    for rows in partitions:
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerows(rows)
+        yield buffer.getvalue()
+
+
+def export_response(engine, model, format: str = "ndjson") -> StreamingResponse:
+    """Потоковая выгрузка всей таблицы модели в NDJSON или CSV, по возрастанию первичного ключа.
+
+    engine должен быть синхронным: StreamingResponse читает генератор в пуле потоков.
+    """
+    table = model.__table__
+    columns = [column.name for column in table.columns]
+    chunks = (_csv if format == "csv" else _ndjson)(columns, _partitions(engine, table))
+    return StreamingResponse(
+        chunks,
+        media_type=EXPORT_FORMATS[format],
+        headers={"Content-Disposition": f'attachment; filename="{table.name}.{format}"'},
+    )
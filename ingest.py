@@ -0,0 +1,161 @@
+import csv
+import importlib
+import io
+import json
+import os
+import sys
+import time
+from itertools import islice
+from typing import Iterable, Iterator, Optional, TextIO
+
+from fastapi import HTTPException
+from pydantic import ValidationError
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import SQLAlchemyError
+
+INGEST_CHUNK_ROWS = int(os.getenv("INGEST_CHUNK_ROWS", "1000"))
+# сколько ошибок по строкам возвращать в ответе; считаются все
+INGEST_MAX_ERRORS = int(os.getenv("INGEST_MAX_ERRORS", "1000"))
+INGEST_FORMATS = ("json", "ndjson", "csv")
+INGEST_FORMAT_PATTERN = "^(json|ndjson|csv)$"
+
+
+def parse_rows(stream: TextIO, format: str) -> Iterator:
+    """Строки входных данных как dict. Непарсящаяся строка NDJSON отдается как исключение."""
+    if format == "json":
+        try:
+            rows = json.load(stream)
+        except ValueError as exc:
+            raise HTTPException(status_code=400, detail=f"Invalid JSON: {exc}")
+        if not isinstance(rows, list):
+            raise HTTPException(status_code=400, detail="Expected a JSON array of rows")
+        yield from rows
+    elif format == "ndjson":
+        for line in stream:
+            if not line.strip():
+                continue
+            try:
+                yield json.loads(line)
+            except ValueError as exc:
+                yield exc
+    else:
+        # пустая ячейка CSV означает "не задано": поле получит значение по умолчанию
+        for row in csv.DictReader(stream):
+            yield {key: value for key, value in row.items() if value != ""}
+
+
+def _describe(exc: Exception) -> str:
+    if isinstance(exc, ValidationError):
+        return "; ".join(f"{'.'.join(map(str, error['loc'])) or 'row'}: {error['msg']}" for error in exc.errors())
+    if isinstance(exc, SQLAlchemyError) and getattr(exc, "orig", None) is not None:
+        return str(exc.orig)
+    return str(exc)
+
+
+def ingest(engine: Engine, model, rows: Iterable, schema=None, chunk_size: int = INGEST_CHUNK_ROWS) -> dict:
+    """Валидирует строки пачками по chunk_size и вставляет каждую пачку одним executemany.
+
+    schema - модель входных данных (например BookCreate), по умолчанию сама модель
+    таблицы. Если пачка не вставилась (например дубликат id), ее строки
+    вставляются по одной, чтобы найти виноватые. Номера строк в ошибках
+    считаются с нуля.
+    """
+    table = model.__table__
+    inserted = failed = 0
+    errors = []
+
+    def fail(index, exc):
+        nonlocal failed
+        failed += 1
+        if len(errors) < INGEST_MAX_ERRORS:
+            errors.append({"row": index, "error": _describe(exc)})
+
+    numbered = enumerate(rows)
+    while True:
+        chunk = list(islice(numbered, chunk_size))
+        if not chunk:
+            break
+        valid = []
+        for index, raw in chunk:
+            try:
+                if isinstance(raw, Exception):
+                    raise raw
+                row = schema.model_validate(raw).model_dump() if schema is not None else raw
+                valid.append((index, model.model_validate(row).model_dump()))
+            except (ValidationError, ValueError, TypeError) as exc:
+                fail(index, exc)
+        if not valid:
+            continue
+        try:
+            with engine.begin() as connection:
+                connection.execute(table.insert(), [values for _, values in valid])
+            inserted += len(valid)
+        except SQLAlchemyError:
+            for index, values in valid:
+                try:
+                    with engine.begin() as connection:
+                        connection.execute(table.insert(), values)
+                    inserted += 1
+                except SQLAlchemyError as exc:
+                    fail(index, exc)
+
+    errors.sort(key=lambda error: error["row"])
+    return {"inserted": inserted, "failed": failed, "errors": errors}
+
+
+def ingest_body(engine: Engine, model, body: bytes, format: str, schema=None) -> dict:
+    try:
+        text = body.decode("utf-8-sig")
+    except UnicodeDecodeError:
+        raise HTTPException(status_code=400, detail="Body must be UTF-8")
+    return ingest(engine, model, parse_rows(io.StringIO(text, newline=""), format), schema)
+
+
+# ---- ИМПОРТ ИЗ КОМАНДНОЙ СТРОКИ ----
+
+# цель -> (модуль приложения, модель таблицы, модель входных данных)
+TARGETS = {
+    "students": ("database", "Student", None),
+    "teachers": ("database", "Teacher", None),
+    "books": ("library2", "Book", "BookCreate"),
+    "tasks": ("to_do_list", "Task", "TaskCreate"),
+}
+
+
+def guess_format(path: str) -> Optional[str]:
+    extension = os.path.splitext(path)[1].lower()
+    return {".json": "json", ".ndjson": "ndjson", ".jsonl": "ndjson", ".csv": "csv"}.get(extension)
+
+
+def main(argv):
+    usage = f"usage: python ingest.py {{{'|'.join(TARGETS)}}} FILE [{'|'.join(INGEST_FORMATS)}]"
+    if len(argv) not in (2, 3) or argv[0] not in TARGETS:
+        sys.exit(usage)
+    target, path = argv[0], argv[1]
+    format = argv[2] if len(argv) == 3 else guess_format(path)
+    if format not in INGEST_FORMATS:
+        sys.exit(usage)
+
+    module_name, model_name, schema_name = TARGETS[target]
+    module = importlib.import_module(module_name)
+    model = getattr(module, model_name)
+    schema = getattr(module, schema_name) if schema_name else None
+
+    start = time.perf_counter()
+    with open(path, encoding="utf-8-sig", newline="") as stream:
+        try:
+            report = ingest(module.engine, model, parse_rows(stream, format), schema)
+        except HTTPException as exc:
+            sys.exit(exc.detail)
+    elapsed = time.perf_counter() - start
+
+    for error in report["errors"]:
+        print(f"row {error['row']}: {error['error']}", file=sys.stderr)
+    print(f"{report['inserted']} inserted, {report['failed']} failed in {elapsed:.2f} s "
+          f"({report['inserted'] / elapsed if elapsed else 0:.0f} rows/s)")
+    if report["failed"]:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -1,39 +1,53 @@
-from fastapi import FastAPI
-from pydantic import BaseModel
+import atexit
+from fastapi import FastAPI, Query
+from pydantic import BaseModel, Field
+from book_catalogue import ID_MAX, ID_MIN, YEAR_MAX, YEAR_MIN, BookCatalogue
+from persistence import Journal
 
 
 app = FastAPI()
-books = []
-sort_books_by_author = []
-books_ids = []
 
 
 class Book(BaseModel):
-    id: int
+    id: int = Field(ge=ID_MIN, le=ID_MAX)
     title: str
     author: str
-    year: int
+    year: int = Field(ge=YEAR_MIN, le=YEAR_MAX)
+
+
+catalogue = BookCatalogue(factory=Book)
+journal = Journal("books", catalogue)
+atexit.register(journal.close)
 
 
 @app.post("/books")
 def add_book(book: Book):
-    if book.id not in books_ids:
-        books_ids.append(book.id)
-        books.append(book)
+    if journal.write(catalogue.record(book), lambda: book.id not in catalogue, lambda: catalogue.add(book)):
         return "book added"
     else:
         return "this book already added"
 
 @app.get("/books")
-def get_books(author: str = None):
-    if author:
-        sort_books_by_author.clear()
-        for book in books:
-            if book.author == author:
-                sort_books_by_author.append(book)
-        if sort_books_by_author:
-            return sort_books_by_author
+def get_books(author: str = None, year: int = None):
+    journal.refresh()
+    if author or year is not None:
+        found = catalogue.find(author=author or None, year=year)
+        if found:
+            return found
         else:
             return "error"
         
-    return books
\ No newline at end of file
+    return catalogue.all()
+
+@app.get("/books/search")
+def search_books(author: str = "", title: str = "", limit: int = Query(default=20, ge=1, le=1000)):
+    journal.refresh()
+    return catalogue.search(author_prefix=author, title_prefix=title, limit=limit)
+
+@app.get("/books/{book_id}")
+def get_book(book_id: int):
+    journal.refresh()
+    book = catalogue.get(book_id)
+    if book is None:
+        return "error"
+    return book
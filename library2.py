@@ -1,11 +1,23 @@
-from fastapi import FastAPI, Depends, HTTPException
-from sqlmodel import SQLModel, Field, Session, create_engine, select
-from typing import  Optional
+from fastapi import FastAPI, Depends, HTTPException, Query, Request
+from fastapi.concurrency import run_in_threadpool
+from sqlmodel import SQLModel, Field, Session, select
+from typing import  List, Optional
+from bulk_mutations import bulk_update, bulk_delete, patch_by_id
+from db import DB_ASYNC, create_sqlite_engine, create_async_sqlite_engine, session_dependency, session_endpoint
+from export import EXPORT_FORMAT_PATTERN, export_response
+from ingest import INGEST_FORMAT_PATTERN, ingest_body
+from pagination import PAGE_SIZE, MAX_PAGE_SIZE, paginate
+from response_cache import ResponseCache
+from sql_metrics import instrument
 
 app = FastAPI()
 
 DATABASE_URL = "sqlite:///./library.db"
-engine = create_engine(DATABASE_URL, connect_args={"check_same_thread" : False})
+engine = create_sqlite_engine(DATABASE_URL)
+request_engine = create_async_sqlite_engine(DATABASE_URL) if DB_ASYNC else engine
+instrument(app, request_engine)
+response_cache = ResponseCache()
+response_cache.attach(app)
 
 class Book(SQLModel, table=True):
     id: Optional[int] = Field(default=None, primary_key=True)
@@ -29,26 +41,72 @@ class BookUpdate(SQLModel):
     author: Optional[str] = None
     published_year: Optional[int] = None
 
+# поля фильтра для bulk-эндпоинтов, суффиксы см. bulk_mutations.OPERATORS
+class BookFilter(SQLModel):
+    id__in: Optional[List[int]] = None
+    author: Optional[str] = None
+    published_year: Optional[int] = None
+    published_year__lt: Optional[int] = None
+    published_year__gte: Optional[int] = None
+
+class BookBulkUpdate(SQLModel):
+    where: BookFilter
+    values: BookUpdate
+
 SQLModel.metadata.create_all(engine)
 
-def get_session():
-    with Session(engine) as session:
-        yield session
+get_session = session_dependency(request_engine)
 
 @app.post("/books")
+@session_endpoint()
 def create_books(book: BookCreate, session: Session = Depends(get_session)):
     db_book = Book(title=book.title, author=book.author, published_year=book.published_year)
     session.add(db_book)
     session.commit()
+    response_cache.invalidate("book")
     session.refresh(db_book)
     return db_book
 
+@app.post("/books/bulk")
+async def create_books_bulk(request: Request, format: str = Query(default="json", pattern=INGEST_FORMAT_PATTERN)):
+    report = await run_in_threadpool(ingest_body, engine, Book, await request.body(), format, BookCreate)
+    if report["inserted"]:
+        response_cache.invalidate("book")
+    return report
+
+@app.post("/books/bulk-update")
+@session_endpoint()
+def update_books_bulk(body: BookBulkUpdate, returning: bool = False, session: Session = Depends(get_session)):
+    result = bulk_update(session, Book, body.where, body.values, returning)
+    if result["affected"]:
+        response_cache.invalidate("book")
+    return result
+
+@app.post("/books/bulk-delete")
+@session_endpoint()
+def delete_books_bulk(where: BookFilter, returning: bool = False, session: Session = Depends(get_session)):
+    result = bulk_delete(session, Book, where, returning)
+    if result["affected"]:
+        response_cache.invalidate("book")
+    return result
+
 @app.get("/books")
-def read_books(session: Session = Depends(get_session)):
-    book = session.exec(select(Book)).all()
-    return book
+@response_cache.cached("book")
+@session_endpoint()
+def read_books(
+    cursor: Optional[str] = None,
+    limit: int = Query(default=PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    session: Session = Depends(get_session)
+):
+    books, next_cursor = paginate(session, select(Book), [Book.id], cursor, limit, key=lambda book: (book.id,))
+    return {"items": books, "next_cursor": next_cursor}
+
+@app.get("/books/export")
+def export_books(format: str = Query(default="ndjson", pattern=EXPORT_FORMAT_PATTERN)):
+    return export_response(engine, Book, format)
 
 @app.get("/books/{book_id}")
+@session_endpoint()
 def read_book(book_id: int, session: Session = Depends(get_session)):
     book = session.get(Book, book_id)
     if not book:
@@ -56,6 +114,7 @@ def read_book(book_id: int, session: Session = Depends(get_session)):
     return book
 
 @app.put("/books/{book_id}")
+@session_endpoint()
 def update_book(book_id: int, book_update: BookUpdate, session: Session = Depends(get_session)):
     db_book = session.get(Book, book_id)
     if not db_book:
@@ -68,16 +127,28 @@ def update_book(book_id: int, book_update: BookUpdate, session: Session = Depend
         db_book.published_year = book_update.published_year
     
     session.commit()
+    response_cache.invalidate("book")
     return {
         "message": "Task updated successfully",
         "book": db_book
     }
 
+@app.patch("/books/{book_id}")
+@session_endpoint()
+def patch_book(book_id: int, book_update: BookUpdate, session: Session = Depends(get_session)):
+    book = patch_by_id(session, Book, book_id, book_update)
+    if not book:
+        raise HTTPException(status_code=404, detail="Book not found")
+    response_cache.invalidate("book")
+    return book
+
 @app.delete("/books/{book_id}")
+@session_endpoint()
 def delete_book(book_id: int, session: Session = Depends(get_session)):
     book = session.get(Book, book_id)
     if not book:
         raise HTTPException(status_code=404, detail="Book not found")
     session.delete(book)
     session.commit()
+    response_cache.invalidate("book")
     return {"message": "Book deleted successfully"}
\ No newline at end of file
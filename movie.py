@@ -1,38 +1,67 @@
-from typing import Union
+from typing import Optional, Union
+import atexit
 import json
-from fastapi import FastAPI
-from pydantic import BaseModel
+from fastapi import FastAPI, Query
+from pydantic import BaseModel, Field
+from movie_store import ID_MAX, ID_MIN, ORDER_COLUMNS, YEAR_MAX, YEAR_MIN, MovieStore
+from persistence import Journal
 
 
 app = FastAPI()
 
-movies = []
-movie_ids = []
+movies = MovieStore()
+journal = Journal("movies", movies)
+atexit.register(journal.close)
 
 class Movie(BaseModel):
-    id : int
+    id : int = Field(ge=ID_MIN, le=ID_MAX)
     title : str
-    year : int
+    year : int = Field(ge=YEAR_MIN, le=YEAR_MAX)
     rating : float
 
 
 @app.get("/movies")
 def get_movies():
-    return movies
+    journal.refresh()
+    return movies.all()
+
+@app.get("/movies/query")
+def query_movies(
+    year_from: Optional[int] = None,
+    year_to: Optional[int] = None,
+    min_rating: Optional[float] = None,
+    max_rating: Optional[float] = None,
+    order_by: str = Query(default="rating", pattern=f"^({'|'.join(ORDER_COLUMNS)})$"),
+    desc: bool = True,
+    limit: int = Query(default=20, ge=1, le=1000),
+    offset: int = Query(default=0, ge=0)
+):
+    journal.refresh()
+    total, items = movies.query(year_from, year_to, min_rating, max_rating, order_by, desc, limit, offset)
+    return {"total": total, "items": items}
 
 @app.get("/movies/{movie_id}")
 def get_movie(movie_id: int):
-    for movie in movies:
-        if movie.id == movie_id:
-            return movie
-    return {"error": "movie not found"}
+    journal.refresh()
+    movie = movies.get(movie_id)
+    if movie is None:
+        return {"error": "movie not found"}
+    return movie
+
+@app.get("/movies/{movie_id}/rank")
+def get_movie_rank(movie_id: int, same_year: bool = False):
+    journal.refresh()
+    rank = movies.rank(movie_id, same_year)
+    if rank is None:
+        return {"error": "movie not found"}
+    return rank
 
         
 @app.post("/movies")
 def add_movie(movie : Movie):
-    if movie.id in movie_ids:
+    if not journal.write(movies.record(movie.id, movie.title, movie.year, movie.rating),
+                         lambda: movie.id not in movies,
+                         lambda: movies.add(movie.id, movie.title, movie.year, movie.rating)):
         return "allready added"
-    movies.append(movie)
-    movie_ids.append(movie.id)
 
     return {"message" : f"Movie {movie.title} added!"}
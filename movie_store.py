@@ -0,0 +1,225 @@
+import struct
+import threading
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+# столбцы, по которым можно сортировать в query
+ORDER_COLUMNS = ("rating", "year", "id")
+
+# запись журнала: id, year, rating, длина title в байтах, затем title
+MOVIE_RECORD = struct.Struct("<qidI")
+# диапазоны полей записи и столбцов ids/years; модель API проверяет их,
+# иначе struct.pack упадет на записи
+ID_MIN, ID_MAX = -2**63, 2**63 - 1
+YEAR_MIN, YEAR_MAX = -2**31, 2**31 - 1
+# снимок: число фильмов, затем столбцы ids, years, ratings, title_offsets и буфер titles как есть
+SNAPSHOT_COUNT = struct.Struct("<Q")
+
+
+class MovieStore:
+    """Фильмы по столбцам: id, year и rating в растущих массивах NumPy,
+    названия - одним UTF-8 буфером со смещениями, плюс словарь id -> строка.
+
+    Фильтры, сортировка и top-K выполняются векторно по первым size строкам.
+    """
+
+    def __init__(self, capacity: int = 1024):
+        self.size = 0
+        self.ids = np.empty(capacity, dtype=np.int64)
+        self.years = np.empty(capacity, dtype=np.int32)
+        self.ratings = np.empty(capacity, dtype=np.float64)
+        # название строки i - titles[title_offsets[i]:title_offsets[i + 1]]
+        self.title_offsets = np.zeros(capacity + 1, dtype=np.int64)
+        self.titles = bytearray()
+        self.rows: Dict[int, int] = {}
+        self._lock = threading.Lock()
+
+    def _reserve(self, size: int):
+        capacity = len(self.ids)
+        if size <= capacity:
+            return
+        while capacity < size:
+            capacity *= 2
+        for name in ("ids", "years", "ratings"):
+            column = getattr(self, name)
+            grown = np.empty(capacity, dtype=column.dtype)
+            grown[:self.size] = column[:self.size]
+            setattr(self, name, grown)
+        offsets = np.zeros(capacity + 1, dtype=np.int64)
+        offsets[:self.size + 1] = self.title_offsets[:self.size + 1]
+        self.title_offsets = offsets
+
+    def add(self, movie_id: int, title: str, year: int, rating: float) -> bool:
+        """Добавляет фильм, False если фильм с таким id уже есть."""
+        with self._lock:
+            if movie_id in self.rows:
+                return False
+            row = self.size
+            self._reserve(row + 1)
+            self.ids[row] = movie_id
+            self.years[row] = year
+            self.ratings[row] = rating
+            self.titles += title.encode()
+            self.title_offsets[row + 1] = len(self.titles)
+            self.rows[movie_id] = row
+            self.size = row + 1
+            return True
+
+    def load(self, movies: Iterable[Tuple[int, str, int, float]]):
+        """Массовая загрузка кортежей (id, title, year, rating) одним присваиванием
+        срезов; повторные id пропускаются."""
+        with self._lock:
+            batch = {}
+            for movie in movies:
+                if movie[0] not in self.rows:
+                    batch.setdefault(movie[0], movie)
+            if not batch:
+                return
+            ids, titles, years, ratings = zip(*batch.values())
+            start, end = self.size, self.size + len(ids)
+            self._reserve(end)
+            self.ids[start:end] = ids
+            self.years[start:end] = years
+            self.ratings[start:end] = ratings
+            encoded = [title.encode() for title in titles]
+            lengths = np.fromiter(map(len, encoded), dtype=np.int64, count=len(encoded))
+            self.title_offsets[start + 1:end + 1] = len(self.titles) + np.cumsum(lengths)
+            self.titles += b"".join(encoded)
+            self.rows.update(zip(ids, range(start, end)))
+            self.size = end
+
+    def _row(self, row: int) -> dict:
+        start, end = self.title_offsets[row], self.title_offsets[row + 1]
+        return {
+            "id": int(self.ids[row]),
+            "title": self.titles[start:end].decode(),
+            "year": int(self.years[row]),
+            "rating": float(self.ratings[row]),
+        }
+
+    def __len__(self) -> int:
+        return self.size
+
+    def __contains__(self, movie_id: int) -> bool:
+        return movie_id in self.rows
+
+    def get(self, movie_id: int) -> Optional[dict]:
+        with self._lock:
+            row = self.rows.get(movie_id)
+            return None if row is None else self._row(row)
+
+    def all(self) -> List[dict]:
+        with self._lock:
+            return [self._row(row) for row in range(self.size)]
+
+    def query(self, year_from: Optional[int] = None, year_to: Optional[int] = None,
+              min_rating: Optional[float] = None, max_rating: Optional[float] = None,
+              order_by: str = "rating", descending: bool = True,
+              limit: int = 20, offset: int = 0) -> Tuple[int, List[dict]]:
+        """Фильмы под фильтрами, упорядоченные по order_by (при равенстве - по id).
+
+        Для первых offset + limit строк используется argpartition, поэтому
+        полная сортировка всех совпадений не нужна. Возвращает (всего, страница).
+        """
+        with self._lock:
+            n = self.size
+            years, ratings = self.years[:n], self.ratings[:n]
+            mask = np.ones(n, dtype=bool)
+            if year_from is not None:
+                mask &= years >= year_from
+            if year_to is not None:
+                mask &= years <= year_to
+            if min_rating is not None:
+                mask &= ratings >= min_rating
+            if max_rating is not None:
+                mask &= ratings <= max_rating
+            rows = np.flatnonzero(mask)
+            total = len(rows)
+
+            need = min(offset + limit, total)
+            if need == 0:
+                return total, []
+            keys = getattr(self, order_by + "s")[rows]
+            if descending:
+                keys = -keys
+            if need < total:
+                # все строки с ключом не хуже need-го, включая равные ему, чтобы
+                # порядок при равенстве ключей не зависел от argpartition
+                kth = keys[np.argpartition(keys, need - 1)[need - 1]]
+                candidates = np.flatnonzero(keys <= kth)
+                rows, keys = rows[candidates], keys[candidates]
+            order = np.lexsort((self.ids[rows], keys))[offset:need]
+            return total, [self._row(row) for row in rows[order]]
+
+    def rank(self, movie_id: int, same_year: bool = False) -> Optional[dict]:
+        """Место фильма по рейтингу (1 - лучший) среди всех фильмов или фильмов того же года."""
+        with self._lock:
+            row = self.rows.get(movie_id)
+            if row is None:
+                return None
+            n = self.size
+            ratings = self.ratings[:n]
+            if same_year:
+                ratings = ratings[self.years[:n] == self.years[row]]
+            rating = self.ratings[row]
+            better = int(np.count_nonzero(ratings > rating))
+            not_better = len(ratings) - better
+            return {
+                **self._row(row),
+                "rank": better + 1,
+                "out_of": len(ratings),
+                "percentile": 100.0 * not_better / len(ratings),
+            }
+
+    def memory_bytes(self) -> int:
+        columns = self.ids.nbytes + self.years.nbytes + self.ratings.nbytes + self.title_offsets.nbytes
+        return columns + len(self.titles)
+
+    # ---- ЖУРНАЛ И СНИМКИ ----
+
+    @staticmethod
+    def record(movie_id: int, title: str, year: int, rating: float) -> bytes:
+        encoded = title.encode()
+        return MOVIE_RECORD.pack(movie_id, year, rating, len(encoded)) + encoded
+
+    @staticmethod
+    def _decode(record) -> Tuple[int, str, int, float]:
+        movie_id, year, rating, length = MOVIE_RECORD.unpack_from(record)
+        start = MOVIE_RECORD.size
+        return movie_id, str(record[start:start + length], "utf-8"), year, rating
+
+    def replay(self, records):
+        self.load(map(self._decode, records))
+
+    def snapshot_state(self):
+        with self._lock:
+            n = self.size
+            return (self.ids[:n].copy(), self.years[:n].copy(), self.ratings[:n].copy(),
+                    self.title_offsets[:n + 1].copy(), bytes(self.titles))
+
+    def encode_snapshot(self, state) -> bytes:
+        ids, years, ratings, title_offsets, titles = state
+        return b"".join((SNAPSHOT_COUNT.pack(len(ids)), ids.tobytes(), years.tobytes(),
+                         ratings.tobytes(), title_offsets.tobytes(), titles))
+
+    def restore(self, buffer):
+        """Загрузка снимка: столбцы читаются из буфера np.frombuffer и копируются одним присваиванием."""
+        (n,) = SNAPSHOT_COUNT.unpack_from(buffer)
+        offset = SNAPSHOT_COUNT.size
+        columns = []
+        for dtype, count in ((np.int64, n), (np.int32, n), (np.float64, n), (np.int64, n + 1)):
+            column = np.frombuffer(buffer, dtype=dtype, count=count, offset=offset)
+            columns.append(column)
+            offset += column.nbytes
+        ids, years, ratings, title_offsets = columns
+        with self._lock:
+            self.size = 0
+            self._reserve(max(n, 1))
+            self.ids[:n] = ids
+            self.years[:n] = years
+            self.ratings[:n] = ratings
+            self.title_offsets[:n + 1] = title_offsets
+            self.titles = bytearray(buffer[offset:offset + int(title_offsets[n])])
+            self.rows = dict(zip(self.ids[:n].tolist(), range(n)))
+            self.size = n
@@ -0,0 +1,74 @@
+import base64
+import hashlib
+import hmac
+import json
+import os
+import secrets
+from typing import Callable, Optional, Sequence
+
+from fastapi import HTTPException
+from sqlmodel import literal, tuple_
+
+PAGE_SIZE = int(os.getenv("PAGE_SIZE", "100"))
+MAX_PAGE_SIZE = int(os.getenv("MAX_PAGE_SIZE", "1000"))
+
+# Курсоры подписываются, чтобы клиент не мог подделать позицию. Задайте
+# CURSOR_SECRET или set_cursor_secret(), если курсоры должны переживать
+# перезапуск или работать между несколькими воркерами.
+CURSOR_SECRET = os.getenv("CURSOR_SECRET", "").encode() or secrets.token_bytes(32)
+
+
+def set_cursor_secret(secret: bytes):
+    """Ключ подписи, общий для воркеров приложения; CURSOR_SECRET из окружения важнее."""
+    global CURSOR_SECRET
+    if not os.getenv("CURSOR_SECRET"):
+        CURSOR_SECRET = secret
+
+
+def _b64encode(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).decode().rstrip("=")
+
+
+def _b64decode(data: str) -> bytes:
+    return base64.urlsafe_b64decode(data + "=" * (-len(data) % 4))
+
+
+def _sign(payload: bytes) -> bytes:
+    return hmac.new(CURSOR_SECRET, payload, hashlib.sha256).digest()[:16]
+
+
+def encode_cursor(*values) -> str:
+    payload = json.dumps(values, separators=(",", ":")).encode()
+    return f"{_b64encode(payload)}.{_b64encode(_sign(payload))}"
+
+
+def decode_cursor(cursor: str, size: int) -> list:
+    try:
+        payload, signature = cursor.split(".")
+        payload = _b64decode(payload)
+        if not hmac.compare_digest(_b64decode(signature), _sign(payload)):
+            raise ValueError("bad signature")
+        values = json.loads(payload)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if not isinstance(values, list) or len(values) != size:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return values
+
+
+def paginate(session, query, order_by: Sequence, cursor: Optional[str], limit: int, key: Callable):
+    """Keyset-пагинация: страница строк после курсора по возрастанию order_by.
+
+    Последний столбец order_by должен быть уникальным (обычно id), key(row)
+    возвращает значения order_by для строки. Возвращает (rows, next_cursor).
+    """
+    if cursor:
+        values = decode_cursor(cursor, len(order_by))
+        bound = [literal(value, type_=column.type) for column, value in zip(order_by, values)]
+        if len(order_by) == 1:
+            query = query.where(order_by[0] > bound[0])
+        else:
+            query = query.where(tuple_(*order_by) > tuple_(*bound))
+    rows = session.exec(query.order_by(*order_by).limit(limit + 1)).all()
+    next_cursor = encode_cursor(*key(rows[limit - 1])) if len(rows) > limit else None
+    return rows[:limit], next_cursor
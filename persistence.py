@@ -0,0 +1,380 @@
+import errno
+import fcntl
+import mmap
+import os
+import secrets
+import struct
+import threading
+import time
+import zlib
+from contextlib import contextmanager
+from typing import Callable, List
+
+PERSIST_DIR = os.getenv("PERSIST_DIR", "data")
+# сколько миллисекунд писатель копит записи перед общим fsync
+PERSIST_FSYNC_MS = float(os.getenv("PERSIST_FSYNC_MS", "2"))
+# снимок и новый сегмент журнала после стольких записей
+PERSIST_SNAPSHOT_RECORDS = int(os.getenv("PERSIST_SNAPSHOT_RECORDS", "1000000"))
+
+FRAME = struct.Struct("<II")  # длина и crc32 записи
+SNAPSHOT_HEADER = struct.Struct("<8sQQI")  # сигнатура, поколение, длина, crc32
+SNAPSHOT_MAGIC = b"SNAPSHT1"
+
+
+def frame(record: bytes) -> bytes:
+    return FRAME.pack(len(record), zlib.crc32(record)) + record
+
+
+def read_frames(buffer, offset: int = 0):
+    """Записи журнала из buffer начиная с offset: пары (запись, смещение после нее).
+
+    Останавливается на первой неполной или битой записи - это хвост,
+    недописанный при сбое или еще дописываемый другим процессом.
+    """
+    end = len(buffer)
+    while offset + FRAME.size <= end:
+        length, crc = FRAME.unpack_from(buffer, offset)
+        start = offset + FRAME.size
+        record = buffer[start:start + length]
+        if len(record) < length or zlib.crc32(record) != crc:
+            return
+        offset = start + length
+        yield record, offset
+
+
+def shared_secret(name: str, directory: str = PERSIST_DIR) -> bytes:
+    """Случайный ключ, общий для всех процессов с одним каталогом directory.
+
+    Создается один раз в <name>.key: файл пишется рядом и ставится на место
+    через os.link, который не перезапишет ключ, созданный другим процессом.
+    """
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f"{name}.key")
+    if not os.path.exists(path):
+        temporary = f"{path}.{os.getpid()}.tmp"
+        fd = os.open(temporary, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        try:
+            os.write(fd, secrets.token_bytes(32))
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+        try:
+            os.link(temporary, path)
+        except FileExistsError:
+            pass
+        finally:
+            os.remove(temporary)
+    with open(path, "rb") as file:
+        return file.read()
+
+
+class Journal:
+    """Журнал упреждающей записи и снимки для хранилища в памяти, общие для
+    всех процессов с одним каталогом directory (uvicorn --workers N).
+
+    Каждый процесс держит свою копию хранилища. Запись идет под блокировкой
+    файла <name>.lock: процесс догоняет чужие записи, дописывает изменение в
+    текущий сегмент журнала, применяет его к своей копии и ждет fsync.
+    fsync делает фоновый поток, один на все записи, накопившиеся за
+    PERSIST_FSYNC_MS. Перед чтением хранилища вызывается refresh(): если
+    сегмент вырос, процесс проигрывает новые записи, иначе это fstat и stat.
+
+    Каждые PERSIST_SNAPSHOT_RECORDS записей журнал переходит на новый сегмент,
+    состояние сохраняется снимком, а покрытые им сегменты удаляются. Процесс,
+    отставший на удаленный сегмент, перечитывает снимок. При запуске снимок
+    читается через mmap, затем проигрываются сегменты после него.
+
+    store должен уметь:
+      replay(records)         - применить записи журнала (итератор memoryview,
+                                каждую нужно разобрать до перехода к следующей);
+      snapshot_state()        - быстро скопировать состояние (вызывается под блокировкой);
+      encode_snapshot(state)  - сериализовать копию в bytes;
+      restore(buffer)         - заменить состояние загруженным из снимка.
+    Файлы: <name>.snapshot, <name>.<поколение>.log и <name>.lock в каталоге directory.
+    """
+
+    def __init__(self, name: str, store, directory: str = PERSIST_DIR,
+                 fsync_ms: float = PERSIST_FSYNC_MS, snapshot_records: int = PERSIST_SNAPSHOT_RECORDS):
+        self.name = name
+        self.store = store
+        self.directory = directory
+        self.fsync_delay = fsync_ms / 1000
+        self.snapshot_records = snapshot_records
+        os.makedirs(directory, exist_ok=True)
+
+        self._lock = threading.Lock()  # хранилище и журнал внутри процесса
+        self._fsync_lock = threading.Lock()  # fsync и закрытие сегмента
+        self._lock_fd = os.open(os.path.join(directory, f"{name}.lock"), os.O_RDWR | os.O_CREAT, 0o644)
+        self._synced = threading.Condition()
+        self.written = 0
+        self.synced = 0
+        self.records_since_snapshot = 0
+        self._snapshotting = False
+        self._closed = False
+        self._error = None  # ошибка fsync: после нее журнал больше не принимает записи
+
+        self._fd = None
+        self.generation = 0
+        self.offset = 0
+        self._reset()
+        # долгое проигрывание - без блокировки файла, чтобы воркеры стартовали
+        # параллельно; недописанный хвост можно обрезать только под ней
+        with self._lock:
+            self._catch_up(locked=False)
+            with self._file_lock():
+                self._catch_up(locked=True)
+        self._flusher = threading.Thread(target=self._flush_loop, name=f"journal-{name}", daemon=True)
+        self._flusher.start()
+
+    # ---- ФАЙЛЫ ----
+
+    def _segment_path(self, generation: int) -> str:
+        return os.path.join(self.directory, f"{self.name}.{generation:08d}.log")
+
+    def _snapshot_path(self) -> str:
+        return os.path.join(self.directory, f"{self.name}.snapshot")
+
+    def _segments(self) -> List[int]:
+        prefix, suffix = f"{self.name}.", ".log"
+        generations = []
+        for filename in os.listdir(self.directory):
+            middle = filename[len(prefix):-len(suffix)]
+            if filename.startswith(prefix) and filename.endswith(suffix) and middle.isdigit():
+                generations.append(int(middle))
+        return sorted(generations)
+
+    def _fsync_directory(self):
+        fd = os.open(self.directory, os.O_RDONLY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+    @contextmanager
+    def _file_lock(self):
+        """Блокировка между процессами; берется только под self._lock."""
+        fcntl.flock(self._lock_fd, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(self._lock_fd, fcntl.LOCK_UN)
+
+    def _open_segment(self, generation: int, create: bool = False) -> bool:
+        """Переключается на сегмент generation; False если его уже нет."""
+        flags = os.O_RDWR | os.O_APPEND | (os.O_CREAT if create else 0)
+        try:
+            fd = os.open(self._segment_path(generation), flags, 0o644)
+        except FileNotFoundError:
+            return False
+        with self._fsync_lock:
+            if self._fd is not None:
+                os.fsync(self._fd)
+                os.close(self._fd)
+            self._fd, self.generation, self.offset = fd, generation, 0
+        self.records_since_snapshot = 0
+        return True
+
+    # ---- ВОССТАНОВЛЕНИЕ И ЧУЖИЕ ЗАПИСИ ----
+
+    def _snapshot_generation(self) -> int:
+        try:
+            with open(self._snapshot_path(), "rb") as file:
+                return SNAPSHOT_HEADER.unpack(file.read(SNAPSHOT_HEADER.size))[1]
+        except FileNotFoundError:
+            return 0
+
+    def _restore_snapshot(self) -> int:
+        """Загружает снимок в хранилище и возвращает его поколение (0 - снимка нет)."""
+        path = self._snapshot_path()
+        try:
+            file = open(path, "rb")
+        except FileNotFoundError:
+            return 0
+        with file, mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            magic, generation, length, crc = SNAPSHOT_HEADER.unpack_from(mapped)
+            with memoryview(mapped) as view:
+                payload = view[SNAPSHOT_HEADER.size:SNAPSHOT_HEADER.size + length]
+                if magic != SNAPSHOT_MAGIC or len(payload) != length or zlib.crc32(payload) != crc:
+                    raise RuntimeError(f"Corrupt snapshot {path}")
+                self.store.restore(payload)
+                payload.release()
+        return generation
+
+    def _reset(self):
+        """Загружает снимок и открывает сегмент, с которого начинается журнал после него."""
+        while True:
+            generation = self._restore_snapshot()
+            if self._open_segment(generation):
+                return
+            with self._lock, self._file_lock():
+                # сегмента нет: либо журнал пуст, либо его удалил более новый снимок
+                if self._snapshot_generation() == generation:
+                    self._open_segment(generation, create=True)
+                    return
+
+    def _reload(self):
+        """Процесс отстал на сегменты, которые уже удалил снимок: перечитываем снимок."""
+        while not self._open_segment(self._restore_snapshot()):
+            pass
+
+    def _catch_up(self, locked: bool):
+        """Проигрывает записи после self.offset, в том числе сделанные другими
+        процессами, переходя по сегментам; вызывается под self._lock.
+
+        Неполная запись в конце без блокировки файла может дописываться прямо
+        сейчас, а под ней - осталась от сбоя и обрезается.
+        """
+        while True:
+            # сегмент закрыт, если уже есть следующий; проверяем до чтения,
+            # чтобы не пропустить записи, сделанные перед переходом
+            sealed = os.path.exists(self._segment_path(self.generation + 1))
+            stat = os.fstat(self._fd)
+            if not stat.st_nlink:
+                # сегмент удален: его и следующие за ним покрыл более новый снимок
+                self._reload()
+                continue
+            size = stat.st_size
+            if size > self.offset:
+                data = os.pread(self._fd, size - self.offset, self.offset)
+                consumed = 0
+
+                def records(view):
+                    nonlocal consumed
+                    for record, consumed in read_frames(view):
+                        self.records_since_snapshot += 1
+                        yield record
+
+                with memoryview(data) as view:
+                    self.store.replay(records(view))
+                self.offset += consumed
+                if self.offset < size:
+                    if sealed:
+                        raise RuntimeError(f"Corrupt journal segment {self._segment_path(self.generation)} at offset {self.offset}")
+                    if locked:
+                        os.ftruncate(self._fd, self.offset)
+            if not sealed:
+                return
+            if not self._open_segment(self.generation + 1):
+                self._reload()
+
+    def refresh(self):
+        """Догоняет записи других процессов; вызывается перед чтением хранилища."""
+        with self._lock:
+            self._catch_up(locked=False)
+
+    # ---- ЗАПИСЬ ----
+
+    def write(self, record: bytes, accept: Callable[[], bool], apply: Callable[[], object]) -> bool:
+        """Если accept() разрешает изменение, дописывает record в журнал и только
+        после этого применяет его к хранилищу вызовом apply().
+
+        Возвращает результат accept после того, как запись попала на диск.
+        Если дописать запись не удалось, хранилище не меняется; если не удался
+        fsync, бросает его ошибку.
+        """
+        if self._error is not None:
+            raise self._error
+        data = frame(record)
+        with self._lock, self._file_lock():
+            self._catch_up(locked=True)
+            if not accept():
+                return False
+            try:
+                if os.write(self._fd, data) != len(data):
+                    raise OSError(errno.ENOSPC, "Short write to journal segment")
+            except OSError:
+                # убираем недописанный кусок, чтобы следующая запись встала на границу
+                os.ftruncate(self._fd, self.offset)
+                raise
+            self.offset += len(data)
+            apply()
+            self.written += 1
+            sequence = self.written
+            self.records_since_snapshot += 1
+            snapshot_due = self.records_since_snapshot >= self.snapshot_records and not self._snapshotting
+            if snapshot_due:
+                self._snapshotting = True
+        with self._synced:
+            self._synced.notify_all()
+            while self.synced < sequence and self._error is None:
+                self._synced.wait()
+            if self.synced < sequence:
+                raise self._error
+        if snapshot_due:
+            threading.Thread(target=self.snapshot, name=f"journal-{self.name}-snapshot", daemon=True).start()
+        return True
+
+    def _flush_loop(self):
+        while True:
+            with self._synced:
+                while self.synced == self.written and not self._closed:
+                    self._synced.wait()
+                if self.synced == self.written:
+                    return
+            time.sleep(self.fsync_delay)
+            with self._lock:
+                target, generation, fd = self.written, self.generation, self._fd
+            try:
+                with self._fsync_lock:
+                    # если сегмент уже сменился, fsync сделал _open_segment
+                    if generation == self.generation:
+                        os.fsync(fd)
+            except OSError as exc:
+                # после неудачного fsync нельзя верить, что записи на диске:
+                # ожидающие и все следующие write() получат эту ошибку
+                with self._synced:
+                    self._error = exc
+                    self._synced.notify_all()
+                return
+            self._mark_synced(target)
+
+    def _mark_synced(self, sequence: int):
+        with self._synced:
+            if sequence > self.synced:
+                self.synced = sequence
+                self._synced.notify_all()
+
+    # ---- СНИМКИ ----
+
+    def snapshot(self):
+        """Переходит на новый сегмент, сохраняет снимок состояния на момент
+        перехода и удаляет сегменты, которые он покрывает."""
+        try:
+            with self._lock, self._file_lock():
+                self._catch_up(locked=True)
+                generation = self.generation + 1
+                self._open_segment(generation, create=True)
+                written = self.written
+                state = self.store.snapshot_state()
+            self._mark_synced(written)
+
+            payload = self.store.encode_snapshot(state)
+            path = self._snapshot_path()
+            temporary = f"{path}.{os.getpid()}.tmp"
+            with open(temporary, "wb") as file:
+                file.write(SNAPSHOT_HEADER.pack(SNAPSHOT_MAGIC, generation, len(payload), zlib.crc32(payload)))
+                file.write(payload)
+                file.flush()
+                os.fsync(file.fileno())
+            with self._lock, self._file_lock():
+                # другой процесс мог успеть сохранить снимок новее
+                if self._snapshot_generation() >= generation:
+                    os.remove(temporary)
+                    return
+                os.replace(temporary, path)
+                self._fsync_directory()
+                for old in self._segments():
+                    if old < generation:
+                        os.remove(self._segment_path(old))
+        finally:
+            self._snapshotting = False
+
+    def close(self):
+        with self._synced:
+            self._closed = True
+            self._synced.notify_all()
+        self._flusher.join()
+        with self._lock, self._fsync_lock:
+            os.fsync(self._fd)
+            os.close(self._fd)
+            os.close(self._lock_fd)
@@ -0,0 +1,191 @@
+import struct
+import threading
+from array import array
+from bisect import bisect_left, bisect_right
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# запись журнала: id, price, длина name в байтах, затем name
+PRODUCT_RECORD = struct.Struct("<qdI")
+# диапазон id в записи; модель API проверяет его, иначе struct.pack упадет на записи
+ID_MIN, ID_MAX = -2**63, 2**63 - 1
+# с какого числа товаров проигрывание журнала пересобирает индекс вместо вставок по одной
+BULK_REPLAY = 1024
+# снимок: число товаров, массивы prices и ids в порядке индекса, затем имена
+# в том же порядке, каждое с длиной NAME_LENGTH перед ним
+SNAPSHOT_COUNT = struct.Struct("<Q")
+NAME_LENGTH = struct.Struct("<I")
+
+
+class ProductStore:
+    """Товары в памяти: словарь по id и индекс по цене - два параллельных
+    массива цен и id, отсортированных по (price, id).
+
+    Товар - любой объект с полями id и price (для журнала еще и name);
+    factory(id=, name=, price=) собирает товар из снимка или журнала.
+    """
+
+    def __init__(self, factory=None):
+        self.factory = factory
+        self.by_id: Dict[int, object] = {}
+        self.prices = array("d")
+        self.ids = array("q")
+        self._lock = threading.Lock()
+
+    def load(self, products: Iterable):
+        with self._lock:
+            self.by_id = {}
+            self.prices = array("d")
+            self.ids = array("q")
+            self._extend(products)
+
+    def _extend(self, products: Iterable):
+        """Добавляет пачку товаров; вызывается под блокировкой.
+
+        Новые ключи (price, id) сортируются отдельно и сливаются с индексом
+        одной сортировкой двух упорядоченных серий.
+        """
+        keys = []
+        for product in products:
+            if product.id not in self.by_id:
+                self.by_id[product.id] = product
+                keys.append((product.price, product.id))
+        if not keys:
+            return
+        keys.sort()
+        keys = list(zip(self.prices, self.ids)) + keys
+        keys.sort()
+        self.prices = array("d", (price for price, _ in keys))
+        self.ids = array("q", (product_id for _, product_id in keys))
+
+    def _position(self, price: float, product_id: int) -> int:
+        """Первая позиция в индексе с ключом > (price, product_id)."""
+        lo = bisect_left(self.prices, price)
+        hi = bisect_right(self.prices, price, lo)
+        return bisect_right(self.ids, product_id, lo, hi)
+
+    def add(self, product) -> bool:
+        """Добавляет товар, False если товар с таким id уже есть."""
+        with self._lock:
+            if product.id in self.by_id:
+                return False
+            position = self._position(product.price, product.id)
+            self.prices.insert(position, product.price)
+            self.ids.insert(position, product.id)
+            self.by_id[product.id] = product
+            return True
+
+    def __len__(self) -> int:
+        return len(self.by_id)
+
+    def __contains__(self, product_id: int) -> bool:
+        return product_id in self.by_id
+
+    def all(self) -> List:
+        with self._lock:
+            return list(self.by_id.values())
+
+    def range(self, min_price: float, max_price: float, limit: int,
+              after: Optional[Tuple[float, int]] = None) -> Tuple[int, List, Optional[Tuple[float, int]]]:
+        """Товары с min_price <= price <= max_price по возрастанию цены, O(log n + limit).
+
+        after - ключ (price, id) последнего товара предыдущей страницы.
+        Возвращает (всего в диапазоне, страница, ключ для следующей страницы).
+        """
+        with self._lock:
+            lo = bisect_left(self.prices, min_price)
+            hi = bisect_right(self.prices, max_price, lo)
+            start = max(lo, self._position(*after)) if after else lo
+            end = min(start + limit, hi)
+            page = [self.by_id[product_id] for product_id in self.ids[start:end]]
+            next_key = (self.prices[end - 1], self.ids[end - 1]) if end < hi and page else None
+            return hi - lo, page, next_key
+
+    def cheapest(self, k: int) -> List:
+        with self._lock:
+            return [self.by_id[product_id] for product_id in self.ids[:k]]
+
+    def most_expensive(self, k: int) -> List:
+        with self._lock:
+            return [self.by_id[product_id] for product_id in reversed(self.ids[max(0, len(self.ids) - k):])]
+
+    def histogram(self, buckets: int, min_price: Optional[float] = None, max_price: Optional[float] = None) -> List[dict]:
+        """Число товаров в buckets равных интервалах цены, O(buckets * log n).
+
+        Интервалы полуоткрытые [from, to), последний включает max_price.
+        Незаданная граница берется из данных, но не дальше заданной, так что
+        граница вне данных дает те же buckets интервалов, только пустых.
+        Пустой список - при min_price > max_price или если товаров нет, а
+        одна из границ не задана.
+        """
+        with self._lock:
+            low = self.prices[0] if min_price is None and self.prices else min_price
+            high = self.prices[-1] if max_price is None and self.prices else max_price
+            if low is None or high is None:
+                return []
+            if min_price is None:
+                low = min(low, high)
+            if max_price is None:
+                high = max(high, low)
+            if low > high:
+                return []
+            width = (high - low) / buckets
+            edges = [low + width * i for i in range(buckets)] + [high]
+            positions = [bisect_left(self.prices, edge) for edge in edges[:-1]] + [bisect_right(self.prices, high)]
+            return [
+                {"from": edges[i], "to": edges[i + 1], "count": positions[i + 1] - positions[i]}
+                for i in range(buckets)
+            ]
+
+    # ---- ЖУРНАЛ И СНИМКИ ----
+
+    @staticmethod
+    def record(product) -> bytes:
+        name = product.name.encode()
+        return PRODUCT_RECORD.pack(product.id, product.price, len(name)) + name
+
+    def _decode(self, record):
+        product_id, price, length = PRODUCT_RECORD.unpack_from(record)
+        start = PRODUCT_RECORD.size
+        return self.factory(id=product_id, name=str(record[start:start + length], "utf-8"), price=price)
+
+    def replay(self, records):
+        products = [self._decode(record) for record in records]
+        if len(products) < BULK_REPLAY:
+            for product in products:
+                self.add(product)
+        else:
+            with self._lock:
+                self._extend(products)
+
+    def snapshot_state(self):
+        with self._lock:
+            return self.prices[:], self.ids[:], [self.by_id[product_id] for product_id in self.ids]
+
+    def encode_snapshot(self, state) -> bytes:
+        prices, ids, products = state
+        parts = [SNAPSHOT_COUNT.pack(len(ids)), prices.tobytes(), ids.tobytes()]
+        for product in products:
+            name = product.name.encode()
+            parts.append(NAME_LENGTH.pack(len(name)))
+            parts.append(name)
+        return b"".join(parts)
+
+    def restore(self, buffer):
+        """Загрузка снимка: индекс уже отсортирован, поэтому массивы копируются как есть."""
+        (count,) = SNAPSHOT_COUNT.unpack_from(buffer)
+        offset = SNAPSHOT_COUNT.size
+        prices, ids = array("d"), array("q")
+        prices.frombytes(buffer[offset:offset + 8 * count])
+        offset += 8 * count
+        ids.frombytes(buffer[offset:offset + 8 * count])
+        offset += 8 * count
+        by_id = {}
+        for product_id, price in zip(ids, prices):
+            (length,) = NAME_LENGTH.unpack_from(buffer, offset)
+            offset += NAME_LENGTH.size
+            by_id[product_id] = self.factory(id=product_id, name=str(buffer[offset:offset + length], "utf-8"), price=price)
+            offset += length
+        with self._lock:
+            self.by_id = by_id
+            self.prices = prices
+            self.ids = ids
@@ -0,0 +1,166 @@
+import functools
+import inspect
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Iterable, Optional
+
+from fastapi import FastAPI, Response
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+CACHE_TTL_SECONDS = float(os.getenv("CACHE_TTL_SECONDS", "60"))
+CACHE_MAX_ENTRIES = int(os.getenv("CACHE_MAX_ENTRIES", "10000"))
+CACHE_MAX_BYTES = int(os.getenv("CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+
+# параметры эндпоинтов, которые не входят в ключ кэша
+SESSION_PARAMS = ("db", "session")
+
+
+class MemoryBackend:
+    """LRU-кэш в памяти процесса с TTL и ограничением по суммарному размеру."""
+
+    def __init__(self, ttl: float = CACHE_TTL_SECONDS, max_entries: int = CACHE_MAX_ENTRIES, max_bytes: int = CACHE_MAX_BYTES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._keys_by_tag = {}
+        self._bytes = 0
+        # растет при каждой инвалидации: ответ, прочитанный до нее, не сохраняем
+        self.generation = 0
+        self._lock = threading.Lock()
+        self.hits = self.misses = self.evictions = self.expirations = self.invalidations = 0
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            value, tags, expires_at = entry
+            if expires_at < time.monotonic():
+                self._remove(key)
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key: str, value: bytes, tags: Iterable[str], generation: int):
+        size = len(key) + len(value)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if generation != self.generation:
+                return
+            if key in self._entries:
+                self._remove(key)
+            tags = tuple(tags)
+            self._entries[key] = (value, tags, time.monotonic() + self.ttl)
+            self._bytes += size
+            for tag in tags:
+                self._keys_by_tag.setdefault(tag, set()).add(key)
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def invalidate(self, tags: Iterable[str]):
+        with self._lock:
+            self.generation += 1
+            for tag in tags:
+                for key in self._keys_by_tag.pop(tag, ()):
+                    if key in self._entries:
+                        self._remove(key)
+                        self.invalidations += 1
+
+    def tags(self):
+        with self._lock:
+            return list(self._keys_by_tag)
+
+    def _remove(self, key: str):
+        value, tags, _ = self._entries.pop(key)
+        self._bytes -= len(key) + len(value)
+        for tag in tags:
+            keys = self._keys_by_tag.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._keys_by_tag[tag]
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "invalidations": self.invalidations,
+            }
+
+
+class ResponseCache:
+    """Read-through кэш готовых JSON-ответов GET-эндпоинтов.
+
+    Записи помечаются таблицами, из которых читал эндпоинт, и сбрасываются
+    вызовом invalidate(table) из пишущих эндпоинтов после коммита. С scope
+    запись помечается еще и значением параметра (например comment:5 для
+    комментариев поста 5), тогда invalidate("comment", 5) сбрасывает только ее.
+    """
+
+    def __init__(self, backend=None):
+        self.backend = backend or MemoryBackend()
+
+    def cached(self, *tables: str, scope: Optional[str] = None):
+        def decorator(fn):
+            def lookup(kwargs):
+                params = sorted((name, value) for name, value in kwargs.items() if name not in SESSION_PARAMS)
+                key = f"{fn.__module__}.{fn.__name__}:{params!r}"
+                tags = tables if scope is None else tuple(f"{table}:{kwargs[scope]}" for table in tables)
+                return key, tags
+
+            def store(key, tags, generation, result):
+                if isinstance(result, Response):
+                    return result
+                body = JSONResponse(content=jsonable_encoder(result)).body
+                self.backend.set(key, body, tags, generation)
+                return Response(content=body, media_type="application/json", headers={"X-Cache": "MISS"})
+
+            def hit(body):
+                return Response(content=body, media_type="application/json", headers={"X-Cache": "HIT"})
+
+            if inspect.iscoroutinefunction(fn):
+                @functools.wraps(fn)
+                async def async_wrapper(**kwargs):
+                    key, tags = lookup(kwargs)
+                    generation = self.backend.generation
+                    body = self.backend.get(key)
+                    if body is not None:
+                        return hit(body)
+                    return store(key, tags, generation, await fn(**kwargs))
+                return async_wrapper
+
+            @functools.wraps(fn)
+            def wrapper(**kwargs):
+                key, tags = lookup(kwargs)
+                generation = self.backend.generation
+                body = self.backend.get(key)
+                if body is not None:
+                    return hit(body)
+                return store(key, tags, generation, fn(**kwargs))
+            return wrapper
+        return decorator
+
+    def invalidate(self, table: str, scope=None):
+        if scope is not None:
+            self.backend.invalidate([table, f"{table}:{scope}"])
+        else:
+            prefix = f"{table}:"
+            self.backend.invalidate([table] + [tag for tag in self.backend.tags() if tag.startswith(prefix)])
+
+    def attach(self, app: FastAPI):
+        app.add_api_route("/cache/stats", self.backend.stats, methods=["GET"], include_in_schema=False)
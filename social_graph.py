@@ -0,0 +1,85 @@
+import heapq
+import sys
+import threading
+from array import array
+from collections import defaultdict
+from typing import Dict, Iterable, List, Tuple
+
+from sorted_ids import contains, insert, intersect, remove
+
+
+class SocialGraph:
+    """Граф подписок в памяти: отсортированные массивы id на каждого пользователя."""
+
+    def __init__(self):
+        self.following: Dict[int, array] = {}
+        self.followers: Dict[int, array] = {}
+        self._lock = threading.Lock()
+
+    def load(self, edges: Iterable[Tuple[int, int]]):
+        following = defaultdict(list)
+        followers = defaultdict(list)
+        for follower_id, followed_id in edges:
+            following[follower_id].append(followed_id)
+            followers[followed_id].append(follower_id)
+        with self._lock:
+            self.following = {user_id: array("q", sorted(ids)) for user_id, ids in following.items()}
+            self.followers = {user_id: array("q", sorted(ids)) for user_id, ids in followers.items()}
+
+    def add(self, follower_id: int, followed_id: int):
+        with self._lock:
+            self._insert(self.following, follower_id, followed_id)
+            self._insert(self.followers, followed_id, follower_id)
+
+    def remove(self, follower_id: int, followed_id: int):
+        with self._lock:
+            self._delete(self.following, follower_id, followed_id)
+            self._delete(self.followers, followed_id, follower_id)
+
+    @staticmethod
+    def _insert(index: Dict[int, array], key: int, value: int):
+        insert(index.setdefault(key, array("q")), value)
+
+    @staticmethod
+    def _delete(index: Dict[int, array], key: int, value: int):
+        items = index.get(key)
+        if items is None:
+            return
+        remove(items, value)
+        if not items:
+            del index[key]
+
+    def mutuals(self, user_id: int) -> List[int]:
+        with self._lock:
+            return intersect(self.following.get(user_id, array("q")), self.followers.get(user_id, array("q")))
+
+    def common_followers(self, user_id: int, other_id: int) -> int:
+        with self._lock:
+            return len(intersect(self.followers.get(user_id, array("q")), self.followers.get(other_id, array("q"))))
+
+    def suggestions(self, user_id: int, limit: int = 10) -> List[Tuple[int, int]]:
+        """Друзья друзей, на которых пользователь еще не подписан, по числу общих связей."""
+        with self._lock:
+            following = self.following.get(user_id, array("q"))
+            overlap = defaultdict(int)
+            for friend_id in following:
+                for candidate_id in self.following.get(friend_id, ()):
+                    overlap[candidate_id] += 1
+            overlap.pop(user_id, None)
+            # following - живой массив, который add/remove меняют на месте
+            candidates = [(count, -candidate_id) for candidate_id, count in overlap.items()
+                          if not contains(following, candidate_id)]
+        return [(-negative_id, count) for count, negative_id in heapq.nlargest(limit, candidates)]
+
+    def stats(self) -> dict:
+        with self._lock:
+            edges = sum(len(items) for items in self.following.values())
+            memory = sys.getsizeof(self.following) + sys.getsizeof(self.followers)
+            for index in (self.following, self.followers):
+                memory += sum(sys.getsizeof(items) for items in index.values())
+        return {
+            "users_following": len(self.following),
+            "users_followed": len(self.followers),
+            "edges": edges,
+            "memory_bytes": memory,
+        }
@@ -0,0 +1,91 @@
+from array import array
+from bisect import bisect_left
+from typing import Iterable, List, Sequence
+
+
+def contains(items: Sequence[int], value: int) -> bool:
+    i = bisect_left(items, value)
+    return i < len(items) and items[i] == value
+
+
+def gallop(items: Sequence[int], value: int, lo: int) -> int:
+    """Первая позиция >= value начиная с lo: экспоненциальный шаг, затем бинарный поиск."""
+    step = 1
+    hi = lo
+    while hi < len(items) and items[hi] < value:
+        lo = hi + 1
+        hi += step
+        step *= 2
+    return bisect_left(items, value, lo, min(hi, len(items)))
+
+
+def intersect(a: Sequence[int], b: Sequence[int]) -> List[int]:
+    if len(a) > len(b):
+        a, b = b, a
+    result = []
+    j = 0
+    for value in a:
+        j = gallop(b, value, j)
+        if j == len(b):
+            break
+        if b[j] == value:
+            result.append(value)
+            j += 1
+    return result
+
+
+def intersect_many(lists: Iterable[Sequence[int]]) -> List[int]:
+    lists = sorted(lists, key=len)
+    if not lists:
+        return []
+    result = list(lists[0])
+    for items in lists[1:]:
+        if not result:
+            break
+        result = intersect(result, items)
+    return result
+
+
+def union(a: Sequence[int], b: Sequence[int]) -> List[int]:
+    result = []
+    i = j = 0
+    while i < len(a) and j < len(b):
+        if a[i] < b[j]:
+            result.append(a[i])
+            i += 1
+        elif a[i] > b[j]:
+            result.append(b[j])
+            j += 1
+        else:
+            result.append(a[i])
+            i += 1
+            j += 1
+    result.extend(a[i:])
+    result.extend(b[j:])
+    return result
+
+
+def difference(a: Sequence[int], b: Sequence[int]) -> List[int]:
+    result = []
+    j = 0
+    for value in a:
+        j = gallop(b, value, j)
+        if j == len(b) or b[j] != value:
+            result.append(value)
+    return result
+
+
+def insert(items: array, value: int) -> bool:
+    i = bisect_left(items, value)
+    if i < len(items) and items[i] == value:
+        return False
+    items.insert(i, value)
+    return True
+
+
+def remove(items: array, value: int) -> bool:
+    i = bisect_left(items, value)
+    if i < len(items) and items[i] == value:
+        del items[i]
+        return True
+    return False
@@ -0,0 +1,225 @@
+import logging
+import os
+import re
+import time
+from collections import Counter, defaultdict
+from contextvars import ContextVar
+from typing import Optional
+
+from fastapi import FastAPI, Request
+from fastapi.responses import PlainTextResponse
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger("sql_metrics")
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+STATEMENT_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000)
+
+# одинаковый запрос, выполненный столько раз за один HTTP-запрос, считаем N+1
+N_PLUS_ONE_THRESHOLD = int(os.getenv("SQL_METRICS_N_PLUS_ONE", "5"))
+SLOW_REQUEST_MS = os.getenv("SQL_METRICS_SLOW_MS")
+
+_current = ContextVar("sql_metrics_request", default=None)
+
+_IN_LIST = re.compile(r"\(\s*\?(?:\s*,\s*\?)*\s*\)")
+_NUMBER = re.compile(r"\b\d+\b")
+_SPACES = re.compile(r"\s+")
+
+
+def fingerprint(statement: str) -> str:
+    statement = _NUMBER.sub("?", statement)
+    statement = _IN_LIST.sub("(?)", statement)
+    return _SPACES.sub(" ", statement).strip()
+
+
+class RequestStats:
+    def __init__(self):
+        self.statements = 0
+        self.db_time = 0.0
+        self.rows = 0
+        self.fingerprints = Counter()
+
+    def repeated(self, threshold: int = N_PLUS_ONE_THRESHOLD):
+        return [(fp, n) for fp, n in self.fingerprints.most_common() if n >= threshold]
+
+
+class _CountingCursor:
+    """Обертка над DBAPI-курсором, считающая выбранные строки."""
+
+    def __init__(self, cursor, stats: RequestStats):
+        self._cursor = cursor
+        self._stats = stats
+
+    def fetchone(self):
+        row = self._cursor.fetchone()
+        if row is not None:
+            self._stats.rows += 1
+        return row
+
+    def fetchmany(self, *args):
+        rows = self._cursor.fetchmany(*args)
+        self._stats.rows += len(rows)
+        return rows
+
+    def fetchall(self):
+        rows = self._cursor.fetchall()
+        self._stats.rows += len(rows)
+        return rows
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.sum += value
+        self.count += 1
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+
+
+class RouteMetrics:
+    def __init__(self):
+        self.duration = Histogram(LATENCY_BUCKETS)
+        self.db_time = Histogram(LATENCY_BUCKETS)
+        self.statements = Histogram(STATEMENT_BUCKETS)
+        self.rows = 0
+        self.n_plus_one = 0
+        self.repeated = Counter()
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(**labels) -> str:
+    return ",".join(f'{key}="{_escape(str(value))}"' for key, value in labels.items())
+
+
+class SQLMetrics:
+    def __init__(self, slow_request_ms: Optional[float] = None, n_plus_one_threshold: int = N_PLUS_ONE_THRESHOLD):
+        if slow_request_ms is None and SLOW_REQUEST_MS:
+            slow_request_ms = float(SLOW_REQUEST_MS)
+        self.slow_request_ms = slow_request_ms
+        self.n_plus_one_threshold = n_plus_one_threshold
+        self.routes = defaultdict(RouteMetrics)
+
+    # ---- SQLAlchemy ----
+
+    def attach_engine(self, engine: Engine):
+        # AsyncEngine отдает события через свой sync_engine
+        engine = getattr(engine, "sync_engine", engine)
+        event.listen(engine, "before_cursor_execute", self._before_cursor_execute)
+        event.listen(engine, "after_cursor_execute", self._after_cursor_execute)
+
+    # время старта хранится в контексте оператора, а не в стеке на соединении:
+    # после ошибки after_cursor_execute не вызывается, и стек рос бы навсегда
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        if context is not None:
+            context._sql_metrics_start = time.perf_counter()
+
+    def _after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        start = getattr(context, "_sql_metrics_start", None)
+        elapsed = time.perf_counter() - start if start is not None else 0.0
+        stats = _current.get()
+        if stats is None:
+            return
+        stats.statements += 1
+        stats.db_time += elapsed
+        stats.fingerprints[fingerprint(statement)] += 1
+        if context is not None and cursor.description is not None:
+            context.cursor = _CountingCursor(cursor, stats)
+
+    # ---- FastAPI ----
+
+    def attach_app(self, app: FastAPI):
+        @app.middleware("http")
+        async def sql_metrics_middleware(request: Request, call_next):
+            stats = RequestStats()
+            token = _current.set(stats)
+            start = time.perf_counter()
+            try:
+                response = await call_next(request)
+            finally:
+                _current.reset(token)
+            self.record(request, stats, time.perf_counter() - start)
+            return response
+
+        app.add_api_route("/metrics", self.metrics_endpoint, methods=["GET"], include_in_schema=False)
+
+    def metrics_endpoint(self):
+        return PlainTextResponse(self.render(), media_type="text/plain; version=0.0.4")
+
+    def record(self, request: Request, stats: RequestStats, duration: float):
+        route = request.scope.get("route")
+        path = getattr(route, "path", "unmatched")
+        metrics = self.routes[(request.method, path)]
+        metrics.duration.observe(duration)
+        metrics.db_time.observe(stats.db_time)
+        metrics.statements.observe(stats.statements)
+        metrics.rows += stats.rows
+        repeated = stats.repeated(self.n_plus_one_threshold)
+        if repeated:
+            metrics.n_plus_one += 1
+            for fp, n in repeated:
+                metrics.repeated[fp] += n
+
+        if self.slow_request_ms is not None and duration * 1000 >= self.slow_request_ms:
+            logger.warning(
+                "slow request %s %s: %.1f ms, %d statements, %.1f ms in db, %d rows%s",
+                request.method, path, duration * 1000, stats.statements, stats.db_time * 1000, stats.rows,
+                f", repeated {repeated[0][1]}x: {repeated[0][0]}" if repeated else "",
+            )
+
+    # ---- Prometheus ----
+
+    def render(self) -> str:
+        lines = []
+        histograms = [
+            ("http_request_duration_seconds", "Request latency", "duration"),
+            ("sql_request_db_seconds", "Time spent in the database per request", "db_time"),
+            ("sql_request_statements", "SQL statements per request", "statements"),
+        ]
+        for name, help_text, attr in histograms:
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} histogram")
+            for (method, path), metrics in sorted(self.routes.items()):
+                histogram = getattr(metrics, attr)
+                labels = _labels(method=method, route=path)
+                for bound, count in zip(histogram.buckets, histogram.counts):
+                    lines.append(f'{name}_bucket{{{labels},le="{bound}"}} {count}')
+                lines.append(f'{name}_bucket{{{labels},le="+Inf"}} {histogram.count}')
+                lines.append(f"{name}_sum{{{labels}}} {histogram.sum}")
+                lines.append(f"{name}_count{{{labels}}} {histogram.count}")
+
+        counters = [
+            ("sql_rows_fetched_total", "Rows fetched from the database", "rows"),
+            ("sql_n_plus_one_requests_total", "Requests that repeated a statement fingerprint", "n_plus_one"),
+        ]
+        for name, help_text, attr in counters:
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} counter")
+            for (method, path), metrics in sorted(self.routes.items()):
+                lines.append(f"{name}{{{_labels(method=method, route=path)}}} {getattr(metrics, attr)}")
+
+        lines.append("# HELP sql_repeated_statements_total Executions of statements repeated within one request")
+        lines.append("# TYPE sql_repeated_statements_total counter")
+        for (method, path), metrics in sorted(self.routes.items()):
+            for fp, n in metrics.repeated.most_common():
+                lines.append(f"sql_repeated_statements_total{{{_labels(method=method, route=path, fingerprint=fp[:200])}}} {n}")
+        return "\n".join(lines) + "\n"
+
+
+def instrument(app: FastAPI, engine: Engine, slow_request_ms: Optional[float] = None) -> SQLMetrics:
+    metrics = SQLMetrics(slow_request_ms=slow_request_ms)
+    metrics.attach_engine(engine)
+    metrics.attach_app(app)
+    return metrics
@@ -1,32 +1,71 @@
-from fastapi import FastAPI
-from pydantic import BaseModel
+import atexit
+from fastapi import FastAPI, HTTPException, Query
+from pydantic import BaseModel, Field
+from typing import Optional
+from pagination import encode_cursor, decode_cursor, set_cursor_secret
+from persistence import Journal, shared_secret
+from price_index import ID_MAX, ID_MIN, ProductStore
 
 app = FastAPI()
-products = []
 
 
 class Product(BaseModel):
-    id: int
+    id: int = Field(ge=ID_MIN, le=ID_MAX)
     name: str
     price: float
 
 
+store = ProductStore(factory=Product)
+journal = Journal("products", store)
+atexit.register(journal.close)
+# курсоры /products/search должен принимать любой воркер
+set_cursor_secret(shared_secret("cursor"))
+
+
 @app.post("/products")
 def add_products(product: Product):
-    for product in products:
-        if product.id == product.id:
-            return {"error" : "product with this id already exists"}
-    products.append(product)
+    if not journal.write(store.record(product), lambda: product.id not in store, lambda: store.add(product)):
+        return {"error" : "product with this id already exists"}
     return product
 
 @app.get("/products")
 def get_products():
-    return products
+    journal.refresh()
+    return store.all()
 
 @app.get("/products/search")
-def product_serch(min_price : float, max_price : float):
-    result = []
-    for product in products:
-        if min_price <= product.price <= max_price:
-            result.append(product)
-    return result
\ No newline at end of file
+def product_serch(
+    min_price : float,
+    max_price : float,
+    cursor: Optional[str] = None,
+    limit: int = Query(default=100, ge=1, le=1000)
+):
+    journal.refresh()
+    after = tuple(decode_cursor(cursor, 2)) if cursor else None
+    total, products, next_key = store.range(min_price, max_price, limit, after)
+    return {
+        "total": total,
+        "items": products,
+        "next_cursor": encode_cursor(*next_key) if next_key else None
+    }
+
+@app.get("/products/cheapest")
+def get_cheapest(k: int = Query(default=10, ge=1, le=1000)):
+    journal.refresh()
+    return store.cheapest(k)
+
+@app.get("/products/most-expensive")
+def get_most_expensive(k: int = Query(default=10, ge=1, le=1000)):
+    journal.refresh()
+    return store.most_expensive(k)
+
+@app.get("/products/price-histogram")
+def get_price_histogram(
+    buckets: int = Query(default=10, ge=1, le=1000),
+    min_price: Optional[float] = None,
+    max_price: Optional[float] = None
+):
+    journal.refresh()
+    if min_price is not None and max_price is not None and min_price > max_price:
+        raise HTTPException(status_code=422, detail="min_price must not exceed max_price")
+    return store.histogram(buckets, min_price, max_price)
@@ -0,0 +1,109 @@
+import threading
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+
+class StudentAnalytics:
+    """Колоночный снимок оценок по группам: для каждой группы массивы NumPy
+    оценок (по возрастанию) и id студентов в том же порядке.
+
+    load() строит снимок из всех строк, одиночные записи обновляют его на
+    месте через upsert/remove. Когда перечитывать снимок, решает ChangeTracker.
+    """
+
+    def __init__(self):
+        self.scores: Dict[str, np.ndarray] = {}
+        self.ids: Dict[str, np.ndarray] = {}
+        self.students: Dict[int, Tuple[str, str, float]] = {}
+        self._lock = threading.Lock()
+
+    def load(self, rows: Iterable[Tuple[int, str, str, float]]):
+        students = {student_id: (name, group, float(score)) for student_id, name, group, score in rows}
+        columns = {}
+        for student_id, (_, group, score) in students.items():
+            columns.setdefault(group, ([], []))
+            columns[group][0].append(score)
+            columns[group][1].append(student_id)
+        scores, ids = {}, {}
+        for group, (group_scores, group_ids) in columns.items():
+            group_scores = np.array(group_scores, dtype=np.float64)
+            order = np.argsort(group_scores, kind="stable")
+            scores[group] = group_scores[order]
+            ids[group] = np.array(group_ids, dtype=np.int64)[order]
+        with self._lock:
+            self.students, self.scores, self.ids = students, scores, ids
+
+    def upsert(self, student_id: int, name: str, group: str, score: float):
+        with self._lock:
+            self._remove(student_id)
+            score = float(score)
+            scores = self.scores.get(group, np.empty(0, dtype=np.float64))
+            position = np.searchsorted(scores, score, side="right")
+            self.scores[group] = np.insert(scores, position, score)
+            self.ids[group] = np.insert(self.ids.get(group, np.empty(0, dtype=np.int64)), position, student_id)
+            self.students[student_id] = (name, group, score)
+
+    def remove(self, student_id: int):
+        with self._lock:
+            self._remove(student_id)
+
+    def _remove(self, student_id: int):
+        student = self.students.pop(student_id, None)
+        if student is None:
+            return
+        group = student[1]
+        position = np.flatnonzero(self.ids[group] == student_id)
+        self.scores[group] = np.delete(self.scores[group], position)
+        self.ids[group] = np.delete(self.ids[group], position)
+        if not len(self.ids[group]):
+            del self.scores[group], self.ids[group]
+
+    def groups(self, percentiles: Sequence[float] = (25, 50, 75, 90)) -> List[dict]:
+        with self._lock:
+            result = []
+            for group in sorted(self.scores):
+                scores = self.scores[group]
+                values = np.percentile(scores, [50, *percentiles])
+                result.append({
+                    "group": group,
+                    "count": int(len(scores)),
+                    "mean": float(scores.mean()),
+                    "std": float(scores.std()),
+                    "min": float(scores[0]),
+                    "max": float(scores[-1]),
+                    "median": float(values[0]),
+                    "percentiles": {f"p{percentile:g}": float(value) for percentile, value in zip(percentiles, values[1:])},
+                })
+            return result
+
+    def top(self, group: str, k: int = 10) -> Optional[List[dict]]:
+        """k лучших студентов группы по убыванию оценки, None если группы нет."""
+        with self._lock:
+            if group not in self.scores:
+                return None
+            scores = self.scores[group][::-1][:k]
+            ids = self.ids[group][::-1][:k]
+            return [
+                {"rank": rank, "id": int(student_id), "name": self.students[int(student_id)][0], "average_score": float(score)}
+                for rank, (student_id, score) in enumerate(zip(ids, scores), start=1)
+            ]
+
+    def percentile_rank(self, student_id: int) -> Optional[dict]:
+        """Место студента в группе (1 - лучший) и доля группы с оценкой не выше его."""
+        with self._lock:
+            student = self.students.get(student_id)
+            if student is None:
+                return None
+            _, group, score = student
+            scores = self.scores[group]
+            not_above = int(np.searchsorted(scores, score, side="right"))
+            above = len(scores) - not_above
+            return {
+                "id": student_id,
+                "group": group,
+                "average_score": score,
+                "rank": above + 1,
+                "group_size": int(len(scores)),
+                "percentile": 100.0 * not_above / len(scores),
+            }
@@ -0,0 +1,62 @@
+import threading
+from array import array
+from collections import Counter
+from typing import Dict, Iterable, List, Sequence, Tuple
+
+from sorted_ids import difference, insert, intersect, intersect_many, union
+
+
+class TagIndex:
+    """Инвертированный индекс PostTag: отсортированные списки id постов для каждого тега."""
+
+    def __init__(self):
+        self.posts_by_tag: Dict[int, array] = {}
+        self.tags_by_post: Dict[int, array] = {}
+        self._lock = threading.Lock()
+
+    def load(self, pairs: Iterable[Tuple[int, int]]):
+        posts_by_tag = {}
+        tags_by_post = {}
+        for post_id, tag_id in pairs:
+            posts_by_tag.setdefault(tag_id, []).append(post_id)
+            tags_by_post.setdefault(post_id, []).append(tag_id)
+        with self._lock:
+            self.posts_by_tag = {tag_id: array("q", sorted(ids)) for tag_id, ids in posts_by_tag.items()}
+            self.tags_by_post = {post_id: array("q", sorted(ids)) for post_id, ids in tags_by_post.items()}
+
+    def add(self, post_id: int, tag_ids: Iterable[int]):
+        with self._lock:
+            for tag_id in tag_ids:
+                insert(self.posts_by_tag.setdefault(tag_id, array("q")), post_id)
+                insert(self.tags_by_post.setdefault(post_id, array("q")), tag_id)
+
+    def posting(self, tag_id: int) -> array:
+        return self.posts_by_tag.get(tag_id, array("q"))
+
+    def query(self, all_tags: Sequence[int] = (), any_tags: Sequence[int] = (), not_tags: Sequence[int] = ()) -> List[int]:
+        """Посты со всеми all_tags, хотя бы одним any_tags и без not_tags, по возрастанию id."""
+        with self._lock:
+            result = None
+            if all_tags:
+                result = intersect_many(self.posting(tag_id) for tag_id in set(all_tags))
+            if any_tags:
+                matched = []
+                for tag_id in set(any_tags):
+                    matched = union(matched, self.posting(tag_id))
+                result = matched if result is None else intersect(result, matched)
+            if result is None:
+                return []
+            for tag_id in set(not_tags):
+                if not result:
+                    break
+                result = difference(result, self.posting(tag_id))
+            return result
+
+    def related(self, tag_id: int, limit: int = 10) -> List[Tuple[int, int]]:
+        """Теги, чаще всего встречающиеся вместе с tag_id."""
+        with self._lock:
+            counts = Counter()
+            for post_id in self.posting(tag_id):
+                counts.update(self.tags_by_post.get(post_id, ()))
+        counts.pop(tag_id, None)
+        return counts.most_common(limit)
@@ -0,0 +1,19 @@
+import importlib
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.fixture(scope="session")
+def foreign_key_app(tmp_path_factory):
+    """ForeignKey.py пишет в ./test.db, поэтому модуль импортируется из временного каталога."""
+    cwd = os.getcwd()
+    os.chdir(tmp_path_factory.mktemp("foreign_key"))
+    sys.path.insert(0, ROOT)
+    try:
+        yield importlib.import_module("ForeignKey")
+    finally:
+        os.chdir(cwd)
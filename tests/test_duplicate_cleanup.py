@@ -0,0 +1,42 @@
+"""ForeignKey.py запускается на старой базе с дубликатами лайков и подписок."""
+import os
+import shutil
+import sqlite3
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def import_app(directory):
+    subprocess.run(
+        [sys.executable, "-c", "import ForeignKey"],
+        cwd=directory, env={**os.environ, "PYTHONPATH": ROOT}, check=True,
+    )
+
+
+def test_import_removes_duplicates_before_unique_indexes(tmp_path):
+    shutil.copy(os.path.join(ROOT, "test.db"), tmp_path / "test.db")
+    import_app(tmp_path)
+    # так выглядит база после гонки двух like/follow до уникальных индексов
+    with sqlite3.connect(tmp_path / "test.db") as connection:
+        connection.execute("DROP INDEX ix_like_user_post")
+        connection.execute("DROP INDEX ix_subscription_follower_followed")
+        like = connection.execute('SELECT user_id, post_id FROM "like" LIMIT 1').fetchone()
+        follow = connection.execute("SELECT follower_id, followed_id FROM subscription LIMIT 1").fetchone()
+        connection.execute('INSERT INTO "like" (user_id, post_id) VALUES (?, ?)', like)
+        connection.execute("INSERT INTO subscription (follower_id, followed_id) VALUES (?, ?)", follow)
+        connection.execute("UPDATE postcounters SET likes_count = likes_count + 1 WHERE post_id = ?", (like[1],))
+        connection.execute("UPDATE usercounters SET followers_count = followers_count + 1 WHERE user_id = ?", (follow[1],))
+
+    import_app(tmp_path)
+
+    with sqlite3.connect(tmp_path / "test.db") as connection:
+        assert connection.execute('SELECT count(*) FROM "like" WHERE user_id = ? AND post_id = ?', like).fetchone() == (1,)
+        assert connection.execute(
+            "SELECT count(*) FROM subscription WHERE follower_id = ? AND followed_id = ?", follow
+        ).fetchone() == (1,)
+        assert connection.execute("SELECT likes_count FROM postcounters WHERE post_id = ?", (like[1],)).fetchone() == \
+            connection.execute('SELECT count(*) FROM "like" WHERE post_id = ?', (like[1],)).fetchone()
+        assert connection.execute("SELECT followers_count FROM usercounters WHERE user_id = ?", (follow[1],)).fetchone() == \
+            connection.execute("SELECT count(*) FROM subscription WHERE followed_id = ?", (follow[1],)).fetchone()
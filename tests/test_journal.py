@@ -0,0 +1,95 @@
+"""Восстановление Journal: обрезанный хвост, снимок с хвостом и сегмент,
+удаленный снимком другого процесса."""
+import multiprocessing
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from persistence import Journal, frame  # noqa: E402
+from price_index import ProductStore  # noqa: E402
+
+
+class Product:
+    def __init__(self, id: int, name: str, price: float):
+        self.id, self.name, self.price = id, name, price
+
+
+def open_journal(directory, **options):
+    store = ProductStore(factory=Product)
+    return Journal("products", store, directory=str(directory), fsync_ms=0, **options), store
+
+
+def add(journal, store, product_id: int):
+    product = Product(product_id, f"product{product_id}", float(product_id))
+    return journal.write(store.record(product), lambda: product.id not in store, lambda: store.add(product))
+
+
+def test_restart_drops_torn_last_frame(tmp_path):
+    journal, store = open_journal(tmp_path)
+    for product_id in range(3):
+        add(journal, store, product_id)
+    journal.close()
+    segment = tmp_path / "products.00000000.log"
+    size = segment.stat().st_size
+    # сбой посреди записи четвертого товара
+    with open(segment, "ab") as file:
+        file.write(frame(ProductStore.record(Product(3, "torn", 3.0)))[:-2])
+
+    journal, store = open_journal(tmp_path)
+    assert sorted(store.by_id) == [0, 1, 2]
+    assert segment.stat().st_size == size
+    add(journal, store, 4)
+    journal.close()
+
+    journal, store = open_journal(tmp_path)
+    assert sorted(store.by_id) == [0, 1, 2, 4]
+    journal.close()
+
+
+def test_restart_from_snapshot_and_tail(tmp_path):
+    journal, store = open_journal(tmp_path)
+    for product_id in range(5):
+        add(journal, store, product_id)
+    journal.snapshot()
+    for product_id in range(5, 8):
+        add(journal, store, product_id)
+    journal.close()
+    assert sorted(os.listdir(tmp_path)) == ["products.00000001.log", "products.lock", "products.snapshot"]
+
+    journal, store = open_journal(tmp_path)
+    assert sorted(store.by_id) == list(range(8))
+    assert journal.generation == 1
+    journal.close()
+
+
+def write_and_snapshot(directory):
+    # два снимка подряд: удалены и сегмент читателя, и следующий за ним
+    journal, store = open_journal(directory)
+    for product_id in range(10):
+        add(journal, store, product_id)
+        if product_id in (4, 7):
+            journal.snapshot()
+    journal.close()
+
+
+def test_reader_reloads_after_its_segment_is_unlinked(tmp_path):
+    reader, store = open_journal(tmp_path)
+    add(reader, store, 100)
+
+    writer = multiprocessing.get_context("fork").Process(target=write_and_snapshot, args=(tmp_path,))
+    writer.start()
+    writer.join()
+    assert writer.exitcode == 0
+    assert not (tmp_path / "products.00000000.log").exists()
+
+    reader.refresh()
+    assert sorted(store.by_id) == [*range(10), 100]
+    assert reader.generation == 2
+    add(reader, store, 101)
+    reader.close()
+
+    journal, store = open_journal(tmp_path)
+    assert sorted(store.by_id) == [*range(10), 100, 101]
+    journal.close()
@@ -0,0 +1,42 @@
+"""ProductStore.histogram при границах вне данных."""
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from price_index import ProductStore  # noqa: E402
+
+
+class Product:
+    def __init__(self, id: int, name: str, price: float):
+        self.id, self.name, self.price = id, name, price
+
+
+@pytest.fixture
+def store():
+    store = ProductStore(factory=Product)
+    for product_id in range(5):
+        store.add(Product(product_id, "p", 10.0 + product_id))
+    return store
+
+
+@pytest.mark.parametrize("bounds", [
+    {"min_price": 100},
+    {"min_price": 100, "max_price": 200},
+    {"max_price": 1},
+    {"min_price": 0, "max_price": 1},
+])
+def test_bounds_outside_data_give_empty_buckets(store, bounds):
+    histogram = store.histogram(2, **bounds)
+    assert len(histogram) == 2
+    assert all(bucket["from"] <= bucket["to"] and bucket["count"] == 0 for bucket in histogram)
+
+
+def test_inverted_bounds_give_no_buckets(store):
+    assert store.histogram(2, min_price=5, max_price=1) == []
+
+
+def test_buckets_cover_all_products(store):
+    assert [bucket["count"] for bucket in store.histogram(2)] == [2, 3]
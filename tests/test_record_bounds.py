@@ -0,0 +1,37 @@
+"""Значения, не влезающие в запись журнала, отклоняются с 422, а не падают в struct.pack."""
+import importlib
+import os
+import sys
+
+import pytest
+from fastapi.testclient import TestClient
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.fixture(scope="module")
+def apps(tmp_path_factory):
+    # журналы пишутся в ./data относительно текущего каталога
+    cwd = os.getcwd()
+    os.chdir(tmp_path_factory.mktemp("record_bounds"))
+    sys.path.insert(0, ROOT)
+    try:
+        yield {name: importlib.import_module(name).app for name in ("library", "movie", "store")}
+    finally:
+        os.chdir(cwd)
+
+
+@pytest.mark.parametrize("app, path, body", [
+    ("library", "/books", {"id": 1, "title": "t", "author": "a", "year": 3_000_000_000}),
+    ("library", "/books", {"id": 2**63, "title": "t", "author": "a", "year": 2000}),
+    ("movie", "/movies", {"id": 1, "title": "t", "year": 3_000_000_000, "rating": 5}),
+    ("movie", "/movies", {"id": 2**63, "title": "t", "year": 2000, "rating": 5}),
+    ("store", "/products", {"id": 2**63, "name": "n", "price": 1}),
+])
+def test_out_of_range_fields_are_rejected(apps, app, path, body):
+    assert TestClient(apps[app]).post(path, json=body).status_code == 422
+
+
+def test_record_limits_are_accepted(apps):
+    response = TestClient(apps["movie"]).post("/movies", json={"id": 2**63 - 1, "title": "t", "year": 2**31 - 1, "rating": 5})
+    assert response.status_code == 200
@@ -0,0 +1,55 @@
+"""Копии таблиц в памяти ForeignKey.py видят записи других процессов."""
+import sqlite3
+
+from fastapi.testclient import TestClient
+
+
+def test_social_graph_sees_outside_follows(foreign_key_app):
+    client = TestClient(foreign_key_app.app)
+    tracker = foreign_key_app.social_graph_changes
+    tracker.ttl = 0
+    tracker.refresh()
+    reload, reloads = tracker.reload, []
+    tracker.reload = lambda: reloads.append(1) or reload()
+    a, b, c = (client.post("/users/", params={"name": name}).json()["id"] for name in ("a", "b", "c"))
+    client.post(f"/users/{a}/follow/{b}/")
+    client.post(f"/users/{b}/follow/{c}/")
+    assert client.get(f"/users/{a}/suggestions/").json() == [{"id": c, "mutual_connections": 1}]
+    assert reloads == []
+
+    # подписка, записанная другим воркером
+    with sqlite3.connect("test.db") as connection:
+        connection.execute("INSERT INTO subscription (follower_id, followed_id) VALUES (?, ?)", (b, a))
+    assert client.get(f"/users/{a}/mutuals/").json()["mutuals"] == [b]
+    assert len(reloads) == 1
+
+    client.delete(f"/users/{a}/follow/{b}/")
+    assert client.get(f"/users/{a}/mutuals/").json()["mutuals"] == []
+    assert client.get(f"/users/{a}/suggestions/").json() == []
+    assert len(reloads) == 1
+
+
+def test_tag_index_sees_outside_tags(foreign_key_app):
+    client = TestClient(foreign_key_app.app)
+    tracker = foreign_key_app.tag_index_changes
+    tracker.ttl = 0
+    tracker.refresh()
+    reload, reloads = tracker.reload, []
+    tracker.reload = lambda: reloads.append(1) or reload()
+    user = client.post("/users/", params={"name": "author"}).json()["id"]
+    first, second = (
+        client.post("/posts/", params={"title": title, "content": "text", "user_id": user}).json()["id"]
+        for title in ("first", "second")
+    )
+    red, blue = (client.post("/tags/", params={"name": name}).json()["id"] for name in ("red", "blue"))
+    client.post(f"/posts/{first}/tags/", json=[red, blue])
+    client.post(f"/posts/{first}/tags/", json=[red])
+    assert client.get("/posts/by-tags/", params={"all_tags": [red]}).json()["total"] == 1
+    assert reloads == []
+
+    # тег, добавленный другим воркером
+    with sqlite3.connect("test.db") as connection:
+        connection.execute("INSERT INTO posttag (post_id, tag_id) VALUES (?, ?)", (second, red))
+    assert client.get("/posts/by-tags/", params={"all_tags": [red]}).json()["total"] == 2
+    assert client.get(f"/tags/{blue}/related/").json() == [{"tag_id": red, "posts": 1}]
+    assert len(reloads) == 1
@@ -0,0 +1,57 @@
+"""Число SQL-запросов на эндпоинт ForeignKey.py не зависит от числа строк."""
+from fastapi.testclient import TestClient
+from sqlalchemy import event
+
+
+def grow(client, user_id: int, post_id: int, users: int):
+    """Добавляет users пользователей с двумя постами: каждый лайкает post_id,
+    подписан на user_id и сам в подписках у user_id."""
+    for i in range(users):
+        new_id = client.post("/users/", params={"name": f"user{i}"}).json()["id"]
+        for title in ("first", "second"):
+            client.post("/posts/", params={"title": title, "content": "text", "user_id": new_id})
+        client.post(f"/posts/{post_id}/like/", params={"user_id": new_id})
+        client.post(f"/users/{new_id}/follow/{user_id}/")
+        client.post(f"/users/{user_id}/follow/{new_id}/")
+
+
+def count_statements(foreign_key_app, client, path: str) -> int:
+    statements = []
+    # с DB_ASYNC=1 запросы идут через request_engine
+    engine = getattr(foreign_key_app.request_engine, "sync_engine", foreign_key_app.request_engine)
+
+    def before_cursor_execute(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        response = client.get(path)
+    finally:
+        event.remove(engine, "before_cursor_execute", before_cursor_execute)
+    assert response.status_code == 200, response.text
+    return len(statements)
+
+
+def test_statement_count_does_not_grow_with_rows(foreign_key_app):
+    client = TestClient(foreign_key_app.app)
+    paths = [
+        "/posts/{post}/likes/",
+        "/users/{user}/followers/",
+        "/users/{user}/following/",
+        "/users/{user}/posts/",
+        "/users/posts/count/",
+    ]
+
+    user = client.post("/users/", params={"name": "author"}).json()["id"]
+    post = client.post("/posts/", params={"title": "post", "content": "text", "user_id": user}).json()["id"]
+
+    def counts():
+        return {path: count_statements(foreign_key_app, client, path.format(user=user, post=post)) for path in paths}
+
+    grow(client, user, post, 3)
+    small = counts()
+    grow(client, user, post, 30)
+    large = counts()
+
+    assert all(small.values())
+    assert small == large
@@ -0,0 +1,53 @@
+"""Аналитика database.py: свои записи не перечитывают снимок, чужие - перечитывают."""
+import importlib
+import os
+import sqlite3
+import sys
+
+import pytest
+from fastapi.testclient import TestClient
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.fixture(scope="module")
+def app_module(tmp_path_factory):
+    cwd = os.getcwd()
+    os.chdir(tmp_path_factory.mktemp("student_analytics"))
+    sys.path.insert(0, ROOT)
+    try:
+        yield importlib.import_module("database")
+    finally:
+        os.chdir(cwd)
+
+
+def test_reloads_only_on_outside_writes(app_module):
+    client = TestClient(app_module.app)
+    tracker = app_module.student_changes
+    tracker.ttl = 0
+    reload, reloads = tracker.reload, []
+    tracker.reload = lambda: reloads.append(1) or reload()
+
+    def top():
+        response = client.get("/students/analytics/groups/a/top")
+        return [row["name"] for row in response.json()] if response.status_code == 200 else []
+
+    assert top() == []
+    for name, score in (("x", 3), ("y", 4)):
+        client.post("/students", json={"name": name, "group": "a", "average_score": score})
+        top()
+    assert top() == ["y", "x"]
+    x, y = sorted(row["id"] for row in client.get("/students").json()["items"])
+    client.put(f"/students/{x}", json={"name": "x", "group": "a", "average_score": 5})
+    assert top() == ["x", "y"]
+    client.put(f"/students/{x}", json={"name": "x", "group": "a", "average_score": 5})
+    client.patch(f"/students/{y}", json={"average_score": 6})
+    assert top() == ["y", "x"]
+    client.delete(f"/students/{x}")
+    assert top() == ["y"]
+    assert len(reloads) == 1
+
+    with sqlite3.connect("students.db") as connection:
+        connection.execute("""INSERT INTO student (name, "group", average_score) VALUES ('cli', 'a', 9)""")
+    assert top() == ["cli", "y"]
+    assert len(reloads) == 2
@@ -1,12 +1,27 @@
-from fastapi import FastAPI, Depends, HTTPException, Query
-from sqlmodel import SQLModel, Field, Session, create_engine, select
-from typing import Optional
+from fastapi import FastAPI, Depends, HTTPException, Query, Request
+from fastapi.concurrency import run_in_threadpool
+from sqlmodel import SQLModel, Field, Session, select, insert, update, delete, func, literal, text, Index
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from typing import List, Optional
+from bulk_mutations import bulk_update, bulk_delete, patch_by_id
 from datetime import datetime
+import os
+import time
+from db import DB_ASYNC, create_sqlite_engine, create_async_sqlite_engine, ensure_indexes, session_dependency, session_endpoint
+from export import EXPORT_FORMAT_PATTERN, export_response
+from ingest import INGEST_FORMAT_PATTERN, ingest_body
+from pagination import PAGE_SIZE, MAX_PAGE_SIZE, paginate
+from sql_metrics import instrument
 
 app = FastAPI()
 
 DATABASE_URL = "sqlite:///./tasks.db"
-engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False})
+engine = create_sqlite_engine(DATABASE_URL)
+request_engine = create_async_sqlite_engine(DATABASE_URL) if DB_ASYNC else engine
+instrument(app, request_engine)
+
+# на сколько секунд /tasks/claim по умолчанию выдает задачу воркеру
+TASK_LEASE_SECONDS = int(os.getenv("TASK_LEASE_SECONDS", "300"))
 
 class Task(SQLModel, table=True):
     id: Optional[int] = Field(default=None, primary_key=True)
@@ -16,6 +31,9 @@ class Task(SQLModel, table=True):
     created_at: datetime = Field(default_factory=datetime.now)
     priority: int = Field(default=1, ge=1, le=5)
 
+# порядок выдачи в /tasks/claim: незавершенные, сначала высокий приоритет, затем старые
+Index("ix_task_claim", Task.completed, Task.priority.desc(), Task.created_at)
+
 class TaskBase(SQLModel):
     title: str
     description: Optional[str] = None
@@ -35,13 +53,79 @@ class TaskUpdate(TaskBase):
     completed: Optional[bool] = None
     priority : Optional[int] = Field(default=None, ge=1, le=5)
 
+# поля фильтра для bulk-эндпоинтов, суффиксы см. bulk_mutations.OPERATORS
+class TaskFilter(SQLModel):
+    id__in: Optional[List[int]] = None
+    completed: Optional[bool] = None
+    priority: Optional[int] = None
+    priority__lte: Optional[int] = None
+    priority__gte: Optional[int] = None
+
+class TaskBulkUpdate(SQLModel):
+    where: TaskFilter
+    values: TaskUpdate
+
+class TaskCounters(SQLModel, table=True):
+    day: str = Field(primary_key=True)
+    priority: int = Field(primary_key=True)
+    total: int = Field(default=0)
+    completed: int = Field(default=0)
+
+class TaskLease(SQLModel, table=True):
+    task_id: int = Field(foreign_key="task.id", primary_key=True, ondelete="CASCADE")
+    worker: str
+    leased_until: float
+
 SQLModel.metadata.create_all(engine)
 
-def get_session():
+ensure_indexes(engine, Task.__table__)
+
+# Счетчики ведут триггеры, поэтому они верны для любой записи в task,
+# включая /tasks/bulk и ingest.py. День - первые 10 символов created_at.
+TASK_COUNTERS_DDL = [
+    """CREATE TRIGGER IF NOT EXISTS task_counters_insert AFTER INSERT ON task BEGIN
+           INSERT INTO taskcounters (day, priority, total, completed)
+           VALUES (substr(new.created_at, 1, 10), new.priority, 1, new.completed)
+           ON CONFLICT (day, priority) DO UPDATE SET total = total + 1, completed = completed + excluded.completed;
+       END""",
+    """CREATE TRIGGER IF NOT EXISTS task_counters_update AFTER UPDATE OF completed, priority, created_at ON task BEGIN
+           UPDATE taskcounters SET total = total - 1, completed = completed - old.completed
+           WHERE day = substr(old.created_at, 1, 10) AND priority = old.priority;
+           INSERT INTO taskcounters (day, priority, total, completed)
+           VALUES (substr(new.created_at, 1, 10), new.priority, 1, new.completed)
+           ON CONFLICT (day, priority) DO UPDATE SET total = total + 1, completed = completed + excluded.completed;
+           DELETE FROM taskcounters WHERE day = substr(old.created_at, 1, 10) AND priority = old.priority AND total = 0;
+       END""",
+    """CREATE TRIGGER IF NOT EXISTS task_counters_delete AFTER DELETE ON task BEGIN
+           UPDATE taskcounters SET total = total - 1, completed = completed - old.completed
+           WHERE day = substr(old.created_at, 1, 10) AND priority = old.priority;
+           DELETE FROM taskcounters WHERE day = substr(old.created_at, 1, 10) AND priority = old.priority AND total = 0;
+       END""",
+]
+
+with engine.begin() as _connection:
+    for _statement in TASK_COUNTERS_DDL:
+        _connection.execute(text(_statement))
+
+def rebuild_task_counters():
     with Session(engine) as session:
-        yield session
+        session.exec(delete(TaskCounters))
+        day = func.substr(Task.created_at, 1, 10)
+        session.exec(insert(TaskCounters).from_select(
+            ["day", "priority", "total", "completed"],
+            select(day, Task.priority, func.count(), func.sum(Task.completed)).group_by(day, Task.priority)
+        ))
+        session.commit()
+
+# Заполняем счетчики для баз, созданных до появления таблицы
+with Session(engine) as _session:
+    if _session.exec(select(TaskCounters.day).limit(1)).first() is None:
+        rebuild_task_counters()
+
+get_session = session_dependency(request_engine)
 
 @app.post("/tasks")
+@session_endpoint()
 def create_task(task: TaskCreate, session: Session = Depends(get_session)):
     db_task = Task(title=task.title, description=task.description, priority=task.priority)
     session.add(db_task)
@@ -49,10 +133,26 @@ def create_task(task: TaskCreate, session: Session = Depends(get_session)):
     session.refresh(db_task)
     return db_task
 
+@app.post("/tasks/bulk")
+async def create_tasks_bulk(request: Request, format: str = Query(default="json", pattern=INGEST_FORMAT_PATTERN)):
+    report = await run_in_threadpool(ingest_body, engine, Task, await request.body(), format, TaskCreate)
+    return report
+
+@app.post("/tasks/bulk-update")
+@session_endpoint()
+def update_tasks_bulk(body: TaskBulkUpdate, returning: bool = False, session: Session = Depends(get_session)):
+    return bulk_update(session, Task, body.where, body.values, returning)
+
+@app.post("/tasks/bulk-delete")
+@session_endpoint()
+def delete_tasks_bulk(where: TaskFilter, returning: bool = False, session: Session = Depends(get_session)):
+    return bulk_delete(session, Task, where, returning)
+
 @app.get("/tasks")
+@session_endpoint()
 def read_tasks(
-    skip: int = 0,
-    limit: int = 100,
+    cursor: Optional[str] = None,
+    limit: int = Query(default=PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
     completed: bool = None,
     session: Session = Depends(get_session)
 ):
@@ -61,10 +161,15 @@ def read_tasks(
     if completed is not None:
         query = query.where(Task.completed == completed)
     
-    tasks = session.exec(query.offset(skip).limit(limit)).all()
-    return tasks
+    tasks, next_cursor = paginate(session, query, [Task.id], cursor, limit, key=lambda task: (task.id,))
+    return {"items": tasks, "next_cursor": next_cursor}
+
+@app.get("/tasks/export")
+def export_tasks(format: str = Query(default="ndjson", pattern=EXPORT_FORMAT_PATTERN)):
+    return export_response(engine, Task, format)
 
 @app.get("/tasks/{task_id}")
+@session_endpoint()
 def read_task(task_id: int, session: Session = Depends(get_session)):
     task = session.get(Task, task_id)
     if not task:
@@ -72,6 +177,7 @@ def read_task(task_id: int, session: Session = Depends(get_session)):
     return task
 
 @app.put("/tasks/{task_id}")
+@session_endpoint()
 def update_task(task_id: int, task_update: TaskUpdate, session: Session = Depends(get_session)):
     db_task = session.get(Task, task_id)
     if not db_task:
@@ -92,7 +198,16 @@ def update_task(task_id: int, task_update: TaskUpdate, session: Session = Depend
         "task": db_task
     }
 
+@app.patch("/tasks/{task_id}")
+@session_endpoint()
+def patch_task(task_id: int, task_update: TaskUpdate, session: Session = Depends(get_session)):
+    task = patch_by_id(session, Task, task_id, task_update)
+    if not task:
+        raise HTTPException(404, "Task not found")
+    return task
+
 @app.delete("/tasks/{task_id}")
+@session_endpoint()
 def delete_task(task_id: int, session: Session = Depends(get_session)):
     task = session.get(Task, task_id)
     if not task:
@@ -102,14 +217,105 @@ def delete_task(task_id: int, session: Session = Depends(get_session)):
     session.commit()
     return {"message": "Task deleted successfully"}
 
+# ---- ОЧЕРЕДЬ ЗАДАЧ ----
+# Воркер берет задачи через /tasks/claim, продлевает аренду через heartbeat и
+# завершает через complete. Задача с истекшей арендой снова выдается в claim.
+
+@app.post("/tasks/claim")
+@session_endpoint()
+def claim_tasks(
+    worker: str,
+    limit: int = Query(default=1, ge=1, le=100),
+    lease_seconds: int = Query(default=TASK_LEASE_SECONDS, ge=1, le=86400),
+    session: Session = Depends(get_session)
+):
+    now = time.time()
+    leased_until = now + lease_seconds
+    leased = select(TaskLease.task_id).where(TaskLease.task_id == Task.id, TaskLease.leased_until > now).exists()
+    candidates = (
+        select(Task.id, literal(worker), literal(leased_until))
+        .where(Task.completed == False, ~leased)
+        .order_by(Task.priority.desc(), Task.created_at, Task.id)
+        .limit(limit)
+    )
+    # Один INSERT ... SELECT: SQLite берет блокировку записи до чтения кандидатов,
+    # поэтому два воркера не могут получить одну и ту же задачу.
+    statement = sqlite_insert(TaskLease).from_select(["task_id", "worker", "leased_until"], candidates)
+    statement = statement.on_conflict_do_update(
+        index_elements=["task_id"],
+        set_={"worker": statement.excluded.worker, "leased_until": statement.excluded.leased_until}
+    ).returning(TaskLease.task_id)
+    task_ids = session.exec(statement).scalars().all()
+    session.commit()
+    
+    tasks = []
+    if task_ids:
+        tasks = session.exec(
+            select(Task).where(Task.id.in_(task_ids)).order_by(Task.priority.desc(), Task.created_at, Task.id)
+        ).all()
+    return {"worker": worker, "leased_until": leased_until, "tasks": tasks}
+
+@app.post("/tasks/{task_id}/heartbeat")
+@session_endpoint()
+def heartbeat_task(
+    task_id: int,
+    worker: str,
+    lease_seconds: int = Query(default=TASK_LEASE_SECONDS, ge=1, le=86400),
+    session: Session = Depends(get_session)
+):
+    now = time.time()
+    result = session.exec(
+        update(TaskLease)
+        .where(TaskLease.task_id == task_id, TaskLease.worker == worker, TaskLease.leased_until > now)
+        .values(leased_until=now + lease_seconds)
+    )
+    session.commit()
+    if result.rowcount == 0:
+        raise HTTPException(409, "Lease expired or held by another worker")
+    return {"task_id": task_id, "leased_until": now + lease_seconds}
+
+@app.post("/tasks/{task_id}/complete")
+@session_endpoint()
+def complete_task(task_id: int, worker: str, session: Session = Depends(get_session)):
+    result = session.exec(
+        delete(TaskLease)
+        .where(TaskLease.task_id == task_id, TaskLease.worker == worker, TaskLease.leased_until > time.time())
+    )
+    if result.rowcount == 0:
+        session.rollback()
+        raise HTTPException(409, "Lease expired or held by another worker")
+    session.exec(update(Task).where(Task.id == task_id).values(completed=True))
+    session.commit()
+    return {"message": "Task completed successfully"}
+
 @app.get("/stats")
-def get_stats(session: Session = Depends(get_session)):
-    total_tasks = session.exec(select(Task)).all()
-    completed_tasks = session.exec(select(Task).where(Task.completed == True)).all()
+@session_endpoint()
+def get_stats(days: int = Query(default=30, ge=1, le=3660), session: Session = Depends(get_session)):
+    by_priority = session.exec(
+        select(TaskCounters.priority, func.sum(TaskCounters.total), func.sum(TaskCounters.completed))
+        .group_by(TaskCounters.priority)
+        .order_by(TaskCounters.priority)
+    ).all()
+    by_day = session.exec(
+        select(TaskCounters.day, func.sum(TaskCounters.total), func.sum(TaskCounters.completed))
+        .group_by(TaskCounters.day)
+        .order_by(TaskCounters.day.desc())
+        .limit(days)
+    ).all()
+    total_tasks = sum(total for _, total, _ in by_priority)
+    completed_tasks = sum(completed for _, _, completed in by_priority)
     
     return {
-        "total_tasks": len(total_tasks),
-        "completed_tasks": len(completed_tasks),
-        "pending_tasks": len(total_tasks) - len(completed_tasks),
-        "completion_rate": len(completed_tasks) / len(total_tasks) if total_tasks else 0
-    }
\ No newline at end of file
+        "total_tasks": total_tasks,
+        "completed_tasks": completed_tasks,
+        "pending_tasks": total_tasks - completed_tasks,
+        "completion_rate": completed_tasks / total_tasks if total_tasks else 0,
+        "by_priority": [
+            {"priority": priority, "total": total, "completed": completed, "pending": total - completed}
+            for priority, total, completed in by_priority
+        ],
+        "by_day": [
+            {"day": day, "total": total, "completed": completed, "pending": total - completed}
+            for day, total, completed in by_day
+        ]
+    }